@@ -0,0 +1,130 @@
+"""Rendered page cache for anonymous visitors of the event listings."""
+
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .pagination import decode_cursor
+from .routers import primary_reads
+
+PAGE_CACHE_TIMEOUT = 60 * 15
+PAGE_KEY = "bets:page:{view}:{version}:{page}"
+PAGE_VERSION_KEY = "bets:page-version:{view}"
+PAGE_STATS_KEY = "bets:page-stats:{outcome}"
+
+# Deeper page numbers are still served, just not cached
+PAGE_CACHE_MAX_PAGE = 50
+
+LISTING_PAGES = ('home', 'latest_events', 'popular_events')
+BET_COUNT_PAGES = ('home', 'popular_events')
+
+
+def cache_anonymous_page(view_name):
+    """
+    Cache the rendered page of a listing view for anonymous visitors.
+
+    Pages are cached per page number or cursor under a version that
+    ``invalidate_pages`` bumps, so all pages of a view expire at once.
+    Cursors the paginator didn't sign and bogus page numbers are cached as
+    the first page they render, so visitors can't create keys at will.
+    Misses are rendered from the primary database even for views served
+    from the replica, so a lagging replica can't refill the cache with the
+    content that was just invalidated. Works with both sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _cache_anonymous_async_page(view_name, view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page = _page(request)
+            if request.method != 'GET' or page is None or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = PAGE_KEY.format(
+                view=view_name,
+                version=cache.get_or_set(PAGE_VERSION_KEY.format(view=view_name), 1, None),
+                page=page,
+            )
+            content = cache.get(key)
+            if content is not None:
+                _count('hits')
+                return HttpResponse(content)
+
+            _count('misses')
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            # Pages showing flash messages are specific to this visitor
+            if response.status_code == 200 and not get_messages(request).used:
+                cache.set(key, response.content, PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def _cache_anonymous_async_page(view_name, view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        page = _page(request)
+        if request.method != 'GET' or page is None or (await request.auser()).is_authenticated:
+            return await view(request, *args, **kwargs)
+
+        key = PAGE_KEY.format(
+            view=view_name,
+            version=await cache.aget_or_set(PAGE_VERSION_KEY.format(view=view_name), 1, None),
+            page=page,
+        )
+        content = await cache.aget(key)
+        if content is not None:
+            await sync_to_async(_count)('hits')
+            return HttpResponse(content)
+
+        await sync_to_async(_count)('misses')
+        with primary_reads():
+            response = await view(request, *args, **kwargs)
+        if response.status_code == 200 and not get_messages(request).used:
+            await cache.aset(key, response.content, PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
+
+
+def _page(request):
+    """The page part of the cache key, or None if the page isn't cached."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        # Invalid cursors render the first page
+        return cursor if decode_cursor(cursor) else '1'
+    page = request.GET.get('page', '')
+    if not page.isdigit() or int(page) < 1:
+        # Like Paginator.get_page
+        return '1'
+    return str(int(page)) if int(page) <= PAGE_CACHE_MAX_PAGE else None
+
+
+def invalidate_pages(*view_names):
+    """Expire every cached page of the given views."""
+    for view_name in view_names:
+        try:
+            cache.incr(PAGE_VERSION_KEY.format(view=view_name))
+        except ValueError:
+            # No page cached yet, nothing to expire
+            pass
+
+
+def page_cache_stats():
+    """Return the page cache ``hits`` and ``misses`` counted so far."""
+    keys = {outcome: PAGE_STATS_KEY.format(outcome=outcome) for outcome in ('hits', 'misses')}
+    values = cache.get_many(keys.values())
+    return {outcome: values.get(key, 0) for outcome, key in keys.items()}
+
+
+def _count(outcome):
+    key = PAGE_STATS_KEY.format(outcome=outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
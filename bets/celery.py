@@ -14,4 +14,16 @@ app.conf.beat_schedule = {
         'task': 'bets.tasks.check_expired_subscriptions',
         'schedule': crontab(hour=0, minute=0),  # Run daily at midnight
     },
+    'settle-finished-events': {
+        'task': 'bets.tasks.settle_finished_events',
+        'schedule': crontab(minute='*/15'),  # Run every 15 minutes
+    },
+    'refresh-popular-events': {
+        'task': 'bets.tasks.refresh_popular_events',
+        'schedule': crontab(minute='*/5'),  # Run every 5 minutes
+    },
+    'send-pending-notifications': {
+        'task': 'bets.tasks.send_pending_notifications',
+        'schedule': crontab(minute='*'),  # Run every minute
+    },
 }
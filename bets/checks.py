@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cache backends that aren't shared between processes
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register()
+def check_odds_debounce_cache(app_configs, **kwargs):
+    """
+    Debounced odds need a cache shared by the web processes and the workers.
+
+    The debounce flag is set by the web process and cleared by the Celery
+    worker running ``update_event_odds``; with a per-process cache the worker
+    never clears it and later bets stop scheduling recalculations.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.ODDS_RECALC_DEBOUNCE_SECONDS > 0 and backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            "ODDS_RECALC_DEBOUNCE_SECONDS requires a cache shared between processes.",
+            hint="Set CACHE_BACKEND=redis or file, or ODDS_RECALC_DEBOUNCE_SECONDS=0.",
+            obj='ODDS_RECALC_DEBOUNCE_SECONDS',
+            id='bets.E001',
+        )]
+    return []
@@ -0,0 +1,20 @@
+"""Template context shared by every page."""
+
+from django.utils.functional import SimpleLazyObject
+
+
+def notifications(request):
+    """
+    Unread notification count for the navbar.
+
+    Read lazily from the cached per-user counter, so pages that don't show
+    it and anonymous visitors cost nothing.
+    """
+    from .services import get_unread_notification_count
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'unread_notification_count': SimpleLazyObject(lambda: get_unread_notification_count(user)),
+    }
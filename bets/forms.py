@@ -4,6 +4,7 @@ import os
 import json
 
 from django import forms
+from .images import ALLOWED_FORMATS, ImageTooLargeError, inspect_image
 from .models import Event, EventOption
 from datetime import datetime, timedelta
 from django.core.exceptions import ValidationError
@@ -86,12 +87,46 @@ EventOptionFormSet = inlineformset_factory(
 )
 
 
+class ImageHeaderField(forms.FileField):
+    """
+    Image upload field that only parses the image header.
+
+    ``forms.ImageField`` copies in-memory uploads into a new buffer and runs
+    ``verify()`` over all of it. This field reads just enough of the file to
+    learn its format and dimensions and leaves decoding to the image task.
+    """
+    default_error_messages = {
+        'invalid_image': _('El archivo no es una imagen válida.'),
+        'image_too_large': _('La imagen tiene demasiados píxeles.'),
+    }
+
+    def to_python(self, data):
+        f = super().to_python(data)
+        if f is None:
+            return None
+
+        try:
+            info = inspect_image(f)
+        except ImageTooLargeError as e:
+            raise ValidationError(self.error_messages['image_too_large'], code='image_too_large') from e
+        except (UnidentifiedImageError, OSError, SyntaxError) as e:
+            raise ValidationError(self.error_messages['invalid_image'], code='invalid_image') from e
+
+        f.image_info = info
+        # The content type sent by the client is replaced by the real one
+        f.content_type = Image.MIME.get(info.format)
+        return f
+
+
 class ImageUploadForm(forms.ModelForm):
     debug_info = forms.CharField(widget=forms.HiddenInput(), required=False)
 
     class Meta:
         model = Event
         fields = ["title", "description", "image", "deadline", "is_public"]
+        field_classes = {
+            "image": ImageHeaderField,
+        }
         widgets = {
             "name": forms.TextInput(attrs={"class": "form-control"}),
             "image": forms.FileInput(attrs={"class": "form-control"}),
@@ -142,7 +177,7 @@ class ImageUploadForm(forms.ModelForm):
 
     def clean_image(self):
         image = self.cleaned_data.get('image')
-        if not image:
+        if not image or not hasattr(image, 'image_info'):
             # If no new image is provided and we're editing, return the existing image
             if self.instance.pk and self.instance.image:
                 return self.instance.image
@@ -157,21 +192,10 @@ class ImageUploadForm(forms.ModelForm):
         if extension not in ALLOWED_EXTENSIONS:
             raise ValidationError(_('Solo se permiten archivos de imagen (PNG, JPG, JPEG, GIF).'))
 
-        # Check content type
-        if image.content_type not in ALLOWED_MIME_TYPES:
+        # Check content type, as read from the header by ImageHeaderField
+        if image.content_type not in ALLOWED_MIME_TYPES or image.image_info.format not in ALLOWED_FORMATS:
             raise ValidationError(_('El archivo debe ser una imagen válida (PNG, JPG, JPEG, GIF).'))
 
-        try:
-            # Try to open and verify the image
-            img = Image.open(image)
-            img.verify()  # Verify it's a valid image
-            image.seek(0)  # Reset file pointer after verify
-            
-        except UnidentifiedImageError:
-            raise ValidationError(_('El archivo no es una imagen válida.'))
-        except Exception as e:
-            raise ValidationError(_('Error al procesar la imagen: %(error)s') % {'error': str(e)})
-        
         return image
 
     def save(self, commit=True):
@@ -0,0 +1,172 @@
+"""Image processing for event pictures."""
+
+from collections import namedtuple
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+IMAGE_DIMENSIONS = (300, 300)
+
+# Largest image accepted, checked from the header before anything is decoded.
+# A 24 Mpx RGB bitmap already takes ~70MB once decoded.
+MAX_IMAGE_PIXELS = 24_000_000
+
+# Formats accepted for uploads, as reported by Pillow from the file header
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF'}
+
+# Widths of the responsive copies; none is wider than the upload itself
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+
+# Preferred first; formats the local Pillow build can't encode are skipped
+DERIVATIVE_FORMATS = ('avif', 'webp', 'jpeg')
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+EXTENSIONS = {
+    'avif': 'avif',
+    'webp': 'webp',
+    'jpeg': 'jpg',
+}
+
+SAVE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True},
+}
+
+Derivative = namedtuple('Derivative', ['format', 'width', 'height', 'content'])
+
+ImageInfo = namedtuple('ImageInfo', ['format', 'width', 'height'])
+
+
+class ImageTooLargeError(ValueError):
+    """The image has more pixels than ``MAX_IMAGE_PIXELS``."""
+
+
+def inspect_image(file):
+    """
+    Read the format and dimensions of an image from its header.
+
+    Only the first bytes of the file are read and no pixel data is decoded,
+    so this is cheap whatever the image size and rejects decompression
+    bombs before they are expanded.
+
+    Args:
+        file: Open file object with the image
+
+    Returns:
+        ImageInfo: Format and dimensions
+
+    Raises:
+        UnidentifiedImageError: If the header isn't a known image format
+        ImageTooLargeError: If the image has more than ``MAX_IMAGE_PIXELS``
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            info = ImageInfo(img.format, img.width, img.height)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    finally:
+        file.seek(0)
+
+    if info.width * info.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Image of {info.width}x{info.height} pixels exceeds the limit of {MAX_IMAGE_PIXELS}"
+        )
+    return info
+
+
+def available_formats():
+    """Derivative formats this Pillow build can encode, preferred first."""
+    return [fmt for fmt in DERIVATIVE_FORMATS if fmt == 'jpeg' or features.check(fmt)]
+
+
+def open_image(file, max_width=max(DERIVATIVE_WIDTHS)):
+    """
+    Decode an uploaded image into an RGB image.
+
+    The pixel count is checked before decoding. JPEGs are decoded at the
+    smallest DCT scale (1/2, 1/4 or 1/8) that still yields ``max_width``
+    pixels, so the full-resolution bitmap of a large photo is never built.
+
+    Args:
+        file: Open file object with the original image
+        max_width: Widest output the caller will produce from the image
+
+    Returns:
+        Image: The decoded image, flattened onto white if it had transparency
+
+    Raises:
+        ImageTooLargeError: If the image has more than ``MAX_IMAGE_PIXELS``
+    """
+    inspect_image(file)
+    img = Image.open(file)
+    if img.format == 'JPEG' and img.width > max_width:
+        img.draft('RGB', (max_width, max(1, img.height * max_width // img.width)))
+
+    # Convert to RGB if necessary (for PNG with transparency)
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    else:
+        img.load()
+
+    return img
+
+
+def _encode(img, fmt):
+    output = BytesIO()
+    img.save(output, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+    return ContentFile(output.getvalue())
+
+
+def resize_image(img):
+    """
+    Resize a decoded image to fit ``IMAGE_DIMENSIONS`` and encode it as JPEG.
+
+    Args:
+        img: Image returned by ``open_image``
+
+    Returns:
+        ContentFile: The resized JPEG
+    """
+    thumbnail = img.copy()
+    thumbnail.thumbnail(IMAGE_DIMENSIONS, Image.Resampling.LANCZOS)
+    return _encode(thumbnail, 'jpeg')
+
+
+def generate_derivatives(img, widths=DERIVATIVE_WIDTHS):
+    """
+    Encode a decoded image at several widths in every available format.
+
+    Each width is resized once and encoded in all formats. Widths above the
+    image's own width collapse into a single copy at the original size, so
+    small uploads are never upscaled.
+
+    Args:
+        img: Image returned by ``open_image``
+        widths: Target widths in pixels
+
+    Returns:
+        list: ``Derivative`` tuples, narrowest first
+    """
+    formats = available_formats()
+    derivatives = []
+    for width in sorted({min(width, img.width) for width in widths}):
+        height = max(1, round(img.height * width / img.width))
+        if width == img.width:
+            resized = img
+        else:
+            resized = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt in formats:
+            derivatives.append(Derivative(fmt, width, height, _encode(resized, fmt)))
+    return derivatives
@@ -0,0 +1,354 @@
+"""Live odds updates pushed to event pages over Server-Sent Events."""
+
+import asyncio
+from collections import defaultdict
+import json
+import logging
+import re
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .models import EventOption
+
+logger = logging.getLogger('bets')
+
+# Latest odds message of an event, sent to watchers as soon as they connect
+LIVE_ODDS_KEY = "bets:live-odds:{event_id}"
+LIVE_ODDS_TIMEOUT = 60 * 60
+# Redis pub/sub channel of an event's odds updates
+LIVE_ODDS_CHANNEL = "bets:live-odds:{event_id}"
+# Delay before the browser reconnects a dropped stream
+LIVE_ODDS_RETRY_MS = 3000
+# Stream URLs are served by LiveOddsApplication, ahead of Django
+LIVE_ODDS_PATH = re.compile(r'^/event/(?P<event_id>\d+)/odds/$')
+# Tokens granting access to a stream, rendered into the event page
+LIVE_ODDS_TOKEN_SALT = 'bets.live-odds'
+LIVE_ODDS_TOKEN_MAX_AGE = 60 * 60 * 12
+# Seconds a Redis connect or publish may take; odds are published while a
+# bet request finishes, so an unreachable Redis must fail fast
+LIVE_ODDS_REDIS_TIMEOUT = 0.5
+
+
+def odds_snapshot(event_id):
+    """
+    Read the current odds of an event's options in one query.
+
+    Returns:
+        str: JSON message with the event id and, per option, its odds and
+        bet count
+    """
+    options = EventOption.objects.filter(event_id=event_id).order_by('id').values_list(
+        'id', 'current_odds', 'bet_count',
+    )
+    return json.dumps({
+        'event_id': event_id,
+        'options': [
+            {'id': pk, 'odds': str(odds), 'bet_count': bet_count}
+            for pk, odds, bet_count in options
+        ],
+    })
+
+
+def publish_odds(event_id):
+    """
+    Push the current odds of an event to everyone watching it.
+
+    The odds are read once per update, whatever the number of watchers, and
+    stored as the event's latest message for watchers that connect later.
+    Nothing is read when live odds are off or nobody can be watching; the
+    latest message is dropped instead, so the next watcher reads the odds.
+
+    Returns:
+        str: The published message, or None if there was nobody to send it to
+    """
+    broadcaster = get_broadcaster()
+    if broadcaster is None:
+        return None
+    if not broadcaster.has_watchers(event_id):
+        cache.delete(LIVE_ODDS_KEY.format(event_id=event_id))
+        return None
+
+    message = odds_snapshot(event_id)
+    cache.set(LIVE_ODDS_KEY.format(event_id=event_id), message, LIVE_ODDS_TIMEOUT)
+    try:
+        broadcaster.publish(event_id, message)
+    except Exception:
+        # Watchers catch up on the next update; the bet itself went through
+        logger.exception(f"Failed to publish odds of event {event_id}")
+    return message
+
+
+def odds_stream_url(event_id, user_id):
+    """URL of an event's odds stream, signed for ``user_id``."""
+    token = signing.dumps({'event': event_id, 'user': user_id}, salt=LIVE_ODDS_TOKEN_SALT)
+    return f"/event/{event_id}/odds/?token={token}"
+
+
+def _read_odds_snapshot(event_id):
+    # Runs outside of any request, so nothing else releases the connection
+    try:
+        return odds_snapshot(event_id)
+    finally:
+        close_old_connections()
+
+
+async def alatest_odds(event_id):
+    """The latest odds message of an event, read from the database if none was published yet."""
+    message = await cache.aget(LIVE_ODDS_KEY.format(event_id=event_id))
+    if message is None:
+        message = await sync_to_async(_read_odds_snapshot)(event_id)
+        await cache.aset(LIVE_ODDS_KEY.format(event_id=event_id), message, LIVE_ODDS_TIMEOUT)
+    return message
+
+
+async def odds_event_stream(event_id):
+    """
+    Server-Sent Events with an event's odds: the latest odds, then every update.
+
+    A comment line is sent when nothing happened for
+    ``LIVE_ODDS_KEEPALIVE_SECONDS``, so proxies keep the connection open.
+    """
+    broadcaster = get_broadcaster()
+    # Subscribe before reading the latest odds, so no update falls in between
+    subscription = broadcaster.subscribe(event_id)
+    try:
+        yield f"retry: {LIVE_ODDS_RETRY_MS}\nevent: odds\ndata: {await alatest_odds(event_id)}\n\n"
+        while True:
+            message = await subscription.get(timeout=settings.LIVE_ODDS_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: odds\ndata: {message}\n\n"
+    finally:
+        broadcaster.unsubscribe(event_id, subscription)
+
+
+class LiveOddsApplication:
+    """
+    ASGI application serving the odds streams, passing everything else to Django.
+
+    A stream stays open for as long as its page does. Served by Django, each
+    one would keep its request's worker thread and database connection
+    until the browser leaves. Here a stream is a coroutine waiting on its
+    subscription: it uses no thread, and the database only when an event
+    has no cached odds yet. Access is granted by the signed token of
+    ``odds_stream_url`` instead of the session, so opening or reconnecting a
+    stream doesn't query the session, user or event either.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        match = LIVE_ODDS_PATH.match(scope['path']) if scope['type'] == 'http' else None
+        if match is None or settings.LIVE_ODDS_BACKEND == 'none':
+            await self.application(scope, receive, send)
+            return
+
+        if scope['method'] != 'GET':
+            await self._respond(send, 405, b"Method not allowed")
+            return
+        event_id = int(match['event_id'])
+        token = parse_qs(scope['query_string'].decode()).get('token', [''])[0]
+        try:
+            granted = signing.loads(token, salt=LIVE_ODDS_TOKEN_SALT, max_age=LIVE_ODDS_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            granted = None
+        if not granted or granted.get('event') != event_id:
+            await self._respond(send, 403, b"Invalid or expired stream token")
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+
+        writer = asyncio.ensure_future(self._write(event_id, send))
+        listener = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({writer, listener}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancelling the stream unsubscribes it
+            writer.cancel()
+            listener.cancel()
+            error, _ = await asyncio.gather(writer, listener, return_exceptions=True)
+        if isinstance(error, Exception):
+            logger.error(f"Live odds stream of event {event_id} failed", exc_info=error)
+
+    async def _write(self, event_id, send):
+        async for chunk in odds_event_stream(event_id):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _respond(self, send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+class Subscription:
+    """
+    Messages of one event for one watcher.
+
+    Only the latest message is kept: a watcher that falls behind skips
+    straight to the current odds instead of buffering every update.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def put(self, message):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Wait for the next message, or return None after ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroadcaster:
+    """
+    Fan out odds updates to the watchers connected to this process.
+
+    Publishing is safe from any thread; messages are handed to each
+    watcher's event loop. Only suitable for a single process, where odds are
+    updated by the web process itself (``ODDS_RECALC_DEBOUNCE_SECONDS=0``).
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_id):
+        """Register a watcher of ``event_id`` on the running event loop."""
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[event_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, event_id, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(event_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[event_id]
+
+    def watchers(self, event_id):
+        with self._lock:
+            return len(self._subscriptions.get(event_id, ()))
+
+    def has_watchers(self, event_id):
+        """Whether anyone may be watching ``event_id``."""
+        return self.watchers(event_id) > 0
+
+    def publish(self, event_id, message):
+        self.deliver(event_id, message)
+
+    def deliver(self, event_id, message):
+        """Hand a message to every local watcher of an event."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # The watcher's loop is closed, it's about to unsubscribe
+                pass
+
+
+class RedisBroadcaster(InProcessBroadcaster):
+    """
+    Fan out odds updates to the watchers of every web process through Redis.
+
+    Updates are published to one channel per event. Each process holds a
+    single pattern subscription, started with its first watcher, and hands
+    what it receives to its local watchers, so Redis sends every update once
+    per process rather than once per watcher.
+    """
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._client = None
+        self._listener = None
+
+    def has_watchers(self, event_id):
+        # They may be connected to any web process
+        return True
+
+    def publish(self, event_id, message):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                self.url,
+                socket_timeout=LIVE_ODDS_REDIS_TIMEOUT,
+                socket_connect_timeout=LIVE_ODDS_REDIS_TIMEOUT,
+            )
+        self._client.publish(LIVE_ODDS_CHANNEL.format(event_id=event_id), message)
+
+    def subscribe(self, event_id):
+        subscription = super().subscribe(event_id)
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+        return subscription
+
+    async def _listen(self):
+        import redis.asyncio as redis
+
+        # No read timeout: the subscription waits for updates indefinitely
+        client = redis.Redis.from_url(self.url, socket_connect_timeout=LIVE_ODDS_REDIS_TIMEOUT)
+        prefix = LIVE_ODDS_CHANNEL.format(event_id='')
+        try:
+            async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.psubscribe(f"{prefix}*")
+                async for item in pubsub.listen():
+                    channel = item['channel'].decode()
+                    self.deliver(int(channel[len(prefix):]), item['data'].decode())
+        except Exception:
+            logger.exception("Live odds subscription to Redis failed")
+        finally:
+            await client.aclose()
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    """The process-wide broadcaster selected by ``LIVE_ODDS_BACKEND``, None if live odds are off."""
+    global _broadcaster
+    if settings.LIVE_ODDS_BACKEND == 'none':
+        return None
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            if settings.LIVE_ODDS_BACKEND == 'redis':
+                _broadcaster = RedisBroadcaster(settings.LIVE_ODDS_REDIS_URL)
+            else:
+                _broadcaster = InProcessBroadcaster()
+        return _broadcaster
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+SCHEMA = [
+    "CREATE TABLE event (id INTEGER PRIMARY KEY, title TEXT, created_at REAL, bet_count INTEGER DEFAULT 0)",
+    "CREATE INDEX event_created_at ON event (created_at)",
+    "CREATE TABLE bet (id INTEGER PRIMARY KEY, event_id INTEGER, user_id INTEGER, created_at REAL)",
+    "CREATE INDEX bet_event_id ON bet (event_id)",
+]
+
+
+class Command(BaseCommand):
+    help = "Measure mixed read/write throughput of SQLite under each connection profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            action='append',
+            choices=sorted(settings.SQLITE_PROFILES),
+            help="Profile from SQLITE_PROFILES to run; repeat for several (default: all)",
+        )
+        parser.add_argument('--seconds', type=float, default=5, help="Duration of each run (default: 5)")
+        parser.add_argument('--readers', type=int, default=8, help="Threads listing events (default: 8)")
+        parser.add_argument('--writers', type=int, default=4, help="Threads placing bets (default: 4)")
+        parser.add_argument('--events', type=int, default=200, help="Events in the database (default: 200)")
+
+    def handle(self, *args, **options):
+        if options['readers'] + options['writers'] < 1:
+            raise CommandError("Run at least one reader or writer")
+
+        for profile in options['profile'] or sorted(settings.SQLITE_PROFILES):
+            with tempfile.TemporaryDirectory() as directory:
+                result = self._run(profile, os.path.join(directory, 'benchmark.sqlite3'), options)
+            self.stdout.write(
+                f"{profile}: {result['reads'] / result['seconds']:.0f} reads/s, "
+                f"{result['writes'] / result['seconds']:.0f} writes/s, "
+                f"{result['errors']} lock errors"
+            )
+
+    def _run(self, profile, path, options):
+        # A throwaway SQLite alias with the default database's settings but its own file
+        alias = f'benchmark_{profile}'
+        connections.settings[alias] = {
+            **connections.settings['default'],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': settings.SQLITE_PROFILES[profile],
+        }
+        try:
+            self._create_schema(alias, options['events'])
+            stop = threading.Event()
+            counts = {'reads': 0, 'writes': 0, 'errors': 0}
+            lock = threading.Lock()
+
+            def work(write):
+                done = errors = 0
+                try:
+                    while not stop.is_set():
+                        try:
+                            self._write(alias, options['events']) if write else self._read(alias)
+                            done += 1
+                        except OperationalError:
+                            errors += 1
+                finally:
+                    connections[alias].close()
+                with lock:
+                    counts['writes' if write else 'reads'] += done
+                    counts['errors'] += errors
+
+            roles = [False] * options['readers'] + [True] * options['writers']
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(roles)) as pool:
+                futures = [pool.submit(work, write) for write in roles]
+                time.sleep(options['seconds'])
+                stop.set()
+                for future in futures:
+                    future.result()
+            counts['seconds'] = time.perf_counter() - started
+            return counts
+        finally:
+            connections[alias].close()
+            del connections.settings[alias]
+
+    def _create_schema(self, alias, events):
+        now = time.time()
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany(
+                "INSERT INTO event (title, created_at) VALUES (%s, %s)",
+                [(f"Event {n}", now - n) for n in range(events)],
+            )
+
+    def _read(self, alias):
+        # The latest events page
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT id, title, bet_count FROM event ORDER BY created_at DESC LIMIT 20")
+            cursor.fetchall()
+
+    def _write(self, alias, events):
+        # A bet: read the event, insert the bet and bump its counter in one transaction
+        event_id = random.randint(1, events)
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute("SELECT bet_count FROM event WHERE id = %s", [event_id])
+            cursor.fetchone()
+            cursor.execute(
+                "INSERT INTO bet (event_id, user_id, created_at) VALUES (%s, %s, %s)",
+                [event_id, random.randint(1, 1000), time.time()],
+            )
+            cursor.execute("UPDATE event SET bet_count = bet_count + 1 WHERE id = %s", [event_id])
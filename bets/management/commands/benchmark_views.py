@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import statistics
+import threading
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+DEFAULT_PATHS = ['/', '/latest_events/', '/popular_events/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare how many concurrent requests the ASGI and WSGI applications "
+        "serve for the event pages"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS, help="Pages to request in turn")
+        parser.add_argument('--requests', type=int, default=300, help="Requests per application (default: 300)")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight (default: 50)")
+        parser.add_argument(
+            '--wsgi-threads',
+            type=int,
+            default=8,
+            help="Worker threads serving the WSGI application, like a threaded server (default: 8)",
+        )
+        parser.add_argument(
+            '--user',
+            help="Log in as this user, so pages bypass the anonymous page cache",
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['wsgi_threads'] < 1:
+            raise CommandError("--requests, --concurrency and --wsgi-threads must be positive")
+
+        cookie = ''
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            client = Client()
+            client.force_login(user)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        paths = [options['paths'][n % len(options['paths'])] for n in range(options['requests'])]
+        for name, run in (('asgi', self._run_asgi), ('wsgi', self._run_wsgi)):
+            latencies, errors, seconds = run(paths, host, cookie, options)
+            latencies.sort()
+            self.stdout.write(
+                f"{name}: {len(latencies) / seconds:.0f} requests/s, "
+                f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+                f"p95 {latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000:.1f}ms, "
+                f"{errors} errors"
+            )
+
+    def _run_asgi(self, paths, host, cookie, options):
+        """Call the ASGI application with ``concurrency`` requests in flight, as uvicorn would."""
+        from chommies.asgi import application
+
+        async def request(path):
+            path, _, query = path.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'query_string': query.encode(),
+                'headers': [(b'host', host.encode()), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 0),
+                'server': (host, 80),
+            }
+            disconnected = asyncio.Event()
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The client stays connected until the response is sent
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            status = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    disconnected.set()
+
+            await application(scope, receive, send)
+            return status[0]
+
+        async def run():
+            limit = asyncio.Semaphore(options['concurrency'])
+            latencies, errors = [], 0
+
+            async def fetch(path):
+                nonlocal errors
+                async with limit:
+                    started = time.perf_counter()
+                    status = await request(path)
+                    latencies.append(time.perf_counter() - started)
+                    errors += status != 200
+
+            started = time.perf_counter()
+            await asyncio.gather(*(fetch(path) for path in paths))
+            return latencies, errors, time.perf_counter() - started
+
+        return asyncio.run(run())
+
+    def _run_wsgi(self, paths, host, cookie, options):
+        """Call the WSGI application from a fixed pool of worker threads."""
+        from chommies.wsgi import application
+
+        def fetch(path):
+            path, _, query = path.partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'HTTP_HOST': host,
+                'HTTP_COOKIE': cookie,
+                'wsgi.input': BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            status = []
+
+            def start_response(status_line, headers, exc_info=None):
+                status.append(int(status_line.split()[0]))
+
+            try:
+                response = application(environ, start_response)
+                b''.join(response)
+                response.close()
+            finally:
+                in_flight.release()
+            return status[0] != 200
+
+        # Like the ASGI run, ``concurrency`` requests are in flight at once;
+        # those beyond the worker threads wait for one, as in a server's queue
+        in_flight = threading.BoundedSemaphore(options['concurrency'])
+        latencies, futures = [], []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as pool:
+            for path in paths:
+                in_flight.acquire()
+                sent = time.perf_counter()
+                future = pool.submit(fetch, path)
+                future.add_done_callback(lambda _future, sent=sent: latencies.append(time.perf_counter() - sent))
+                futures.append(future)
+        errors = sum(future.result() for future in futures)
+        return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,65 @@
+from datetime import timedelta
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bets.models import Event, EventImageDerivative
+from bets.storage import select_event_image_storage
+
+
+class Command(BaseCommand):
+    help = "Delete event image blobs that no event or derivative references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="List the blobs that would be deleted without deleting them",
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help="Keep unreferenced blobs younger than this, so uploads whose "
+                 "rows aren't committed yet survive (default: 24)",
+        )
+
+    def handle(self, *args, **options):
+        storage = select_event_image_storage()
+        if not storage.exists(storage.prefix):
+            self.stdout.write("No blobs stored yet")
+            return
+
+        referenced = set()
+        for field in ('image', 'original_image'):
+            referenced.update(
+                Event.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).iterator()
+            )
+        referenced.update(EventImageDerivative.objects.values_list('image', flat=True).iterator())
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        deleted = freed = 0
+        for name in self._walk(storage, storage.prefix):
+            if name in referenced or storage.get_modified_time(name) >= cutoff:
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f"Would delete {name}")
+            else:
+                storage.delete(name)
+            deleted += 1
+            freed += size
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} unreferenced blobs ({freed} bytes), {len(referenced)} referenced"
+        ))
+
+    def _walk(self, storage, path):
+        directories, files = storage.listdir(path)
+        for name in files:
+            yield posixpath.join(path, name)
+        for directory in directories:
+            yield from self._walk(storage, posixpath.join(path, directory))
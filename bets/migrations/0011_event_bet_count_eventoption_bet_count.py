@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-16 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_bet_counts(apps, schema_editor):
+    Event = apps.get_model('bets', 'Event')
+    EventOption = apps.get_model('bets', 'EventOption')
+    Bet = apps.get_model('bets', 'Bet')
+
+    def count_of(field):
+        return Coalesce(Subquery(
+            Bet.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+
+    Event.objects.update(bet_count=count_of('event'))
+    EventOption.objects.update(bet_count=count_of('option'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0010_emailnotifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='bet_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='eventoption',
+            name='bet_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_bet_counts, migrations.RunPython.noop),
+    ]
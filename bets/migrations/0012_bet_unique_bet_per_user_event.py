@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-16 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0011_event_bet_count_eventoption_bet_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bet',
+            name='bets_bet_event_i_7a8459_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='bet',
+            constraint=models.UniqueConstraint(fields=('event', 'user'), name='unique_bet_per_user_event'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-16 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0012_bet_unique_bet_per_user_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bet',
+            name='payout',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
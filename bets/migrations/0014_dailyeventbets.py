@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-16 12:41
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_daily_bets(apps, schema_editor):
+    Bet = apps.get_model('bets', 'Bet')
+    DailyEventBets = apps.get_model('bets', 'DailyEventBets')
+
+    since = timezone.now() - timedelta(days=7)
+    rows = (
+        Bet.objects.filter(created_at__gte=since)
+        .annotate(day=TruncDate('created_at'))
+        .values('event_id', 'day')
+        .annotate(bets=Count('pk'))
+        .order_by()
+    )
+    DailyEventBets.objects.bulk_create(
+        (DailyEventBets(event_id=row['event_id'], day=row['day'], bets=row['bets']) for row in rows),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0013_bet_payout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyEventBets',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('bets', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_bets', to='bets.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'day'), name='unique_daily_bets_per_event')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_bets, migrations.RunPython.noop),
+    ]
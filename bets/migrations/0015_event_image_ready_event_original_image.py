@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-16 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0014_dailyeventbets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='image_ready',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='original_image',
+            field=models.ImageField(blank=True, null=True, upload_to='events/%Y/%m/'),
+        ),
+    ]
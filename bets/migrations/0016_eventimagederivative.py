@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0015_event_image_ready_event_original_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('avif', 'AVIF'), ('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=4)),
+                ('width', models.PositiveSmallIntegerField()),
+                ('height', models.PositiveSmallIntegerField()),
+                ('image', models.ImageField(upload_to='events/%Y/%m/derivatives/')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_derivatives', to='bets.event')),
+            ],
+            options={
+                'ordering': ['format', 'width'],
+                'constraints': [models.UniqueConstraint(fields=('event', 'format', 'width'), name='unique_derivative_per_event')],
+            },
+        ),
+    ]
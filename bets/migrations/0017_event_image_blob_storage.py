@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 11:05
+
+import bets.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0016_eventimagederivative'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=bets.storage.select_event_image_storage, upload_to='events/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='original_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=bets.storage.select_event_image_storage, upload_to='events/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='eventimagederivative',
+            name='image',
+            field=models.ImageField(storage=bets.storage.select_event_image_storage, upload_to='events/%Y/%m/derivatives/'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0017_event_image_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailnotifications',
+            name='claim_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailnotifications',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='emailnotifications',
+            index=models.Index(condition=models.Q(('is_sent', False)), fields=['id'], name='bets_notification_unsent_idx'),
+        ),
+    ]
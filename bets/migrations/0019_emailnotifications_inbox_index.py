@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0018_emailnotifications_claim'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailnotifications',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='bets_notification_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:30
+
+import json
+
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+
+def parse_parameters(apps, schema_editor):
+    """Copy the serialized parameters into the JSON column, a chunk at a time."""
+    EmailNotifications = apps.get_model('bets', 'EmailNotifications')
+
+    last_pk = 0
+    while True:
+        chunk = list(
+            EmailNotifications.objects.filter(pk__gt=last_pk, parameters__isnull=False)
+            .exclude(parameters='')
+            .order_by('pk')
+            .only('pk', 'parameters')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for notification in chunk:
+            try:
+                notification.parameters_json = json.loads(notification.parameters)
+            except ValueError:
+                # Keep whatever was stored rather than dropping it
+                notification.parameters_json = {'raw': notification.parameters}
+        EmailNotifications.objects.bulk_update(chunk, ['parameters_json'])
+        last_pk = chunk[-1].pk
+
+
+def serialize_parameters(apps, schema_editor):
+    EmailNotifications = apps.get_model('bets', 'EmailNotifications')
+
+    last_pk = 0
+    while True:
+        chunk = list(
+            EmailNotifications.objects.filter(pk__gt=last_pk, parameters_json__isnull=False)
+            .order_by('pk')
+            .only('pk', 'parameters_json')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for notification in chunk:
+            notification.parameters = json.dumps(notification.parameters_json)
+        EmailNotifications.objects.bulk_update(chunk, ['parameters'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bets', '0019_emailnotifications_inbox_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailnotifications',
+            name='parameters_json',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(parse_parameters, serialize_parameters),
+        migrations.RemoveField(
+            model_name='emailnotifications',
+            name='parameters',
+        ),
+        migrations.RenameField(
+            model_name='emailnotifications',
+            old_name='parameters_json',
+            new_name='parameters',
+        ),
+    ]
@@ -1,20 +1,21 @@
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-import os
-from io import BytesIO
 import logging
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
-from django.core.files import File
 from django.utils import timezone
-from PIL import Image
+
+from .storage import select_event_image_storage
 
 logger = logging.getLogger('bets')
 
 MONTHS_IN_ADVANCE = 3
-IMAGE_DIMENSIONS = (300, 300)
 
 
 STATUS_CHOICES = (
@@ -51,11 +52,19 @@ class Event(models.Model):
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=200, blank=True, null=True)
     description = models.TextField()
-    image = models.ImageField(upload_to="events/%Y/%m/", null=True, blank=True)
+    image = models.ImageField(
+        upload_to="events/%Y/%m/", storage=select_event_image_storage, null=True, blank=True
+    )
+    # The upload as sent by the creator, kept once ``image`` holds the resized copy
+    original_image = models.ImageField(
+        upload_to="events/%Y/%m/", storage=select_event_image_storage, null=True, blank=True, db_index=True
+    )
+    image_ready = models.BooleanField(default=True)
     deadline = models.DateTimeField(db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_public = models.BooleanField(default=True, db_index=True)
+    bet_count = models.PositiveIntegerField(default=0)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name="created_events")
     winner = models.ForeignKey(
         "EventOption",
@@ -76,40 +85,23 @@ class Event(models.Model):
         return self.title
 
     def save(self, *args, **kwargs):
-        if self.image:
-            self._process_image()
+        # Newly uploaded images are resized in the background once stored
+        new_image = bool(self.image) and not self.image._committed
+        if new_image:
+            self.image_ready = False
         super().save(*args, **kwargs)
+        if new_image:
+            self._queue_image_processing()
 
-    def _process_image(self):
-        """Process and resize the uploaded image"""
-        try:
-            # Open and verify the image
-            img = Image.open(self.image)
-
-            # Convert to RGB if necessary (for PNG with transparency)
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1])
-                img = background
-
-            # Resize the image
-            img.thumbnail(IMAGE_DIMENSIONS, Image.Resampling.LANCZOS)
+    def _queue_image_processing(self):
+        """Process the uploaded image after the transaction commits"""
+        from .tasks import process_event_image
 
-            # Save the resized image
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85)
-            output.seek(0)
-
-            # Create a new file with the resized image
-            # Use a new name to avoid overwriting the original
-            original_name = os.path.splitext(self.image.name)[0]
-            new_name = f"resized_{os.path.basename(original_name)}.jpg"
-            self.image.file = File(output, name=new_name)
-
-        except Exception as e:
-            # If image processing fails, log the error and keep the original image
-            logger.warning(f"Failed to process image for event '{self.title}': {str(e)}")
-            # Keep the original image by doing nothing
+        event_id = self.pk
+        if settings.PROCESS_IMAGES_ASYNC:
+            transaction.on_commit(lambda: process_event_image.delay(event_id))
+        else:
+            transaction.on_commit(lambda: process_event_image(event_id))
 
 
 class EventOption(models.Model):
@@ -117,6 +109,7 @@ class EventOption(models.Model):
     title = models.CharField(max_length=255)
     initial_odds = models.DecimalField(max_digits=5, decimal_places=2)
     current_odds = models.DecimalField(max_digits=5, decimal_places=2)
+    bet_count = models.PositiveIntegerField(default=0)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -132,19 +125,64 @@ class Bet(models.Model):
     option = models.ForeignKey(EventOption, on_delete=models.CASCADE, related_name='bets')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     odds = models.DecimalField(max_digits=5, decimal_places=2)
+    # Points paid out when the event was settled; null until then, 0 for a loss
+    payout = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['event', '-created_at']),
-            models.Index(fields=['event', 'user']),  # For checking duplicate bets
+        ]
+        constraints = [
+            # One bet per user and event; also serves as the duplicate lookup index
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_bet_per_user_event'),
         ]
 
     def __str__(self):
         return f"{self.user} - {self.option}: {self.odds}"
 
 
+class DailyEventBets(models.Model):
+    """Bets placed on an event per day, used to rank popular events."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='daily_bets')
+    day = models.DateField(db_index=True)
+    bets = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'day'], name='unique_daily_bets_per_event'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} - {self.day}: {self.bets}"
+
+
+DerivativeFormats = (
+    ("avif", "AVIF"),
+    ("webp", "WebP"),
+    ("jpeg", "JPEG"),
+)
+
+
+class EventImageDerivative(models.Model):
+    """A resized copy of an event image, one row per width and format."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='image_derivatives')
+    format = models.CharField(max_length=4, choices=DerivativeFormats)
+    width = models.PositiveSmallIntegerField()
+    height = models.PositiveSmallIntegerField()
+    image = models.ImageField(upload_to="events/%Y/%m/derivatives/", storage=select_event_image_storage)
+
+    class Meta:
+        ordering = ['format', 'width']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'format', 'width'], name='unique_derivative_per_event'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} - {self.width}w {self.format}"
+
+
 NotificationKinds = (
     ("RE", "Registration"),
     ("SU", "Subscription"),
@@ -156,17 +194,60 @@ NotificationKinds = (
 )
 
 
+class EmailNotificationsQuerySet(models.QuerySet):
+    """Lookups on the JSON ``parameters`` that run in the database."""
+
+    def with_parameters(self, **parameters):
+        """Notifications whose parameters include the given keys and values."""
+        return self.filter(**{f'parameters__{key}': value for key, value in parameters.items()})
+
+    def for_event(self, event_id):
+        return self.with_parameters(event_id=event_id)
+
+    def event_ids(self):
+        """The distinct ``event_id`` parameters, usable as a subquery of event ids."""
+        return (
+            self.annotate(parameter_event_id=Cast(KeyTextTransform('event_id', 'parameters'), models.BigIntegerField()))
+            .filter(parameter_event_id__isnull=False)
+            .order_by()
+            .values('parameter_event_id')
+            .distinct()
+        )
+
+    def duplicates(self):
+        """Notifications repeating the user, kind and parameters of an older one."""
+        earlier = EmailNotifications.objects.filter(
+            user=OuterRef('user'),
+            kind=OuterRef('kind'),
+            parameters=OuterRef('parameters'),
+            pk__lt=OuterRef('pk'),
+        )
+        return self.filter(Exists(earlier))
+
+
 class EmailNotifications(models.Model):
     """
-    Parameters field should be a serialized JSON object, passed as keyword arguments
+    Parameters field holds a JSON object, passed as keyword arguments
     to the notification class.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     kind = models.TextField(max_length=3, choices=NotificationKinds) 
-    parameters = models.TextField(max_length=255, null=True, blank=True)
+    parameters = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     is_sent = models.BooleanField(default=False)
+    # Set while a dispatch worker holds the row; stale claims are taken over
+    claim_id = models.UUIDField(null=True, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = EmailNotificationsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(is_sent=False), name='bets_notification_unsent_idx'),
+            # Inbox listing and unread counts
+            models.Index(fields=['user', 'is_read', '-created_at'], name='bets_notification_inbox_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.kind}"
@@ -0,0 +1,298 @@
+"""Email delivery of ``EmailNotifications``."""
+
+from datetime import timedelta
+from itertools import groupby
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Min, Q, Subquery
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailNotifications, Event
+
+logger = logging.getLogger('bets')
+
+NOTIFICATION_CHUNK_SIZE = 200
+# Users whose digests are claimed and sent together
+DIGEST_CHUNK_SIZE = 100
+# Claims older than this belong to a worker that died and are taken over
+NOTIFICATION_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Per-kind templates; the first line is the subject, the rest the body
+NOTIFICATION_TEMPLATES = {
+    'RE': 'emails/registration.txt',
+    'SU': 'emails/subscription.txt',
+    'DI': 'emails/disabled.txt',
+    'DE': 'emails/deleted_account.txt',
+    'BA': 'emails/balance.txt',
+    'WI': 'emails/win.txt',
+    'LO': 'emails/lose.txt',
+}
+DIGEST_TEMPLATE = 'emails/digest.txt'
+
+# Kinds merged into one email per user when NOTIFICATION_DIGEST_MINUTES is set
+DIGEST_KINDS = ('WI', 'LO', 'BA')
+
+# Kinds identified by their event, sent at most once per user and parameters
+EVENT_KINDS = ('WI', 'LO')
+
+
+def _claimable(now):
+    return Q(is_sent=False) & (
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - NOTIFICATION_CLAIM_TIMEOUT)
+    )
+
+
+def _digest_window():
+    return timedelta(minutes=settings.NOTIFICATION_DIGEST_MINUTES)
+
+
+def _claim(condition, candidates):
+    """Claim the rows matching ``condition`` among ``candidates`` (a pk subquery)."""
+    claim_id = uuid.uuid4()
+    EmailNotifications.objects.filter(condition, pk__in=Subquery(candidates)).update(
+        claim_id=claim_id,
+        claimed_at=timezone.now(),
+    )
+    return list(
+        EmailNotifications.objects.filter(claim_id=claim_id)
+        .select_related('user')
+        .order_by('user_id', 'pk')
+    )
+
+
+def claim_notifications(limit=NOTIFICATION_CHUNK_SIZE):
+    """
+    Claim up to ``limit`` unsent notifications for the calling worker.
+
+    The claim is a single UPDATE that repeats the claimable condition, so
+    when several workers race for the same rows each row is claimed by
+    exactly one of them. In digest mode, digest kinds are left for
+    ``claim_digests``.
+
+    Args:
+        limit: Maximum number of notifications to claim
+
+    Returns:
+        list: The claimed notifications, with their users, by user
+    """
+    condition = _claimable(timezone.now())
+    if settings.NOTIFICATION_DIGEST_MINUTES:
+        condition &= ~Q(kind__in=DIGEST_KINDS)
+    candidates = EmailNotifications.objects.filter(condition).order_by('pk').values('pk')[:limit]
+    return _claim(condition, candidates)
+
+
+def claim_digests(limit=DIGEST_CHUNK_SIZE):
+    """
+    Claim the pending digest notifications of up to ``limit`` users.
+
+    A user's digest is due once their oldest pending digest notification
+    is older than ``NOTIFICATION_DIGEST_MINUTES``; everything pending for
+    them at that point goes into the same email.
+
+    Args:
+        limit: Maximum number of users whose digests are claimed
+
+    Returns:
+        list: The claimed notifications, with their users, by user
+    """
+    now = timezone.now()
+    condition = _claimable(now) & Q(kind__in=DIGEST_KINDS)
+    due_users = (
+        EmailNotifications.objects.filter(condition)
+        .values('user_id')
+        .annotate(oldest=Min('created_at'))
+        .filter(oldest__lte=now - _digest_window())
+        .order_by('user_id')
+        .values('user_id')[:limit]
+    )
+    candidates = EmailNotifications.objects.filter(condition, user_id__in=Subquery(due_users)).values('pk')
+    return _claim(condition, candidates)
+
+
+def release_notifications(notification_ids):
+    """Hand claimed notifications back so a later run retries them."""
+    return EmailNotifications.objects.filter(pk__in=notification_ids, is_sent=False).update(
+        claim_id=None,
+        claimed_at=None,
+    )
+
+
+def build_message(notification, event=None, connection=None):
+    """
+    Render the email for a notification.
+
+    Args:
+        notification: EmailNotifications with its user loaded
+        event: Event the notification is about, if any
+        connection: Email backend the message will be sent with
+
+    Returns:
+        EmailMessage: The message to send
+    """
+    context = {
+        'user': notification.user,
+        'parameters': notification.parameters or {},
+        'event': event,
+    }
+    return _render(NOTIFICATION_TEMPLATES[notification.kind], context, notification.user, connection)
+
+
+def build_digest(notifications, events, connection=None):
+    """
+    Render one email merging several digest notifications of a user.
+
+    Wins and losses are listed per event with the total payout; of the
+    balance updates only the latest is kept.
+
+    Args:
+        notifications: The user's notifications, oldest first
+        events: Events referenced by the notifications, by id
+        connection: Email backend the message will be sent with
+
+    Returns:
+        EmailMessage: The message to send
+    """
+    wins, losses, balance = [], [], None
+    for notification in notifications:
+        params = notification.parameters or {}
+        event = events.get(params.get('event_id'))
+        if notification.kind == 'WI':
+            wins.append({'event': event, 'payout': params.get('payout') or 0})
+        elif notification.kind == 'LO':
+            losses.append({'event': event})
+        elif notification.kind == 'BA':
+            balance = params.get('points', balance)
+
+    user = notifications[0].user
+    context = {
+        'user': user,
+        'wins': wins,
+        'losses': losses,
+        'balance': balance,
+        'total_payout': sum(win['payout'] for win in wins),
+    }
+    return _render(DIGEST_TEMPLATE, context, user, connection)
+
+
+def _render(template_name, context, user, connection):
+    # The first line of the template is the subject, the rest the body
+    rendered = render_to_string(template_name, context).strip()
+    subject, _, body = rendered.partition('\n')
+    return EmailMessage(subject.strip(), body.strip(), to=[user.email], connection=connection)
+
+
+def _deliver(connection, notifications, digest=False):
+    """
+    Render and send a claimed chunk, one email per notification or, for
+    digests, one per user.
+
+    Returns:
+        tuple: Notifications sent, emails sent, notifications skipped and
+        notifications failed
+    """
+    # The events the chunk refers to, selected by the JSON key in SQL
+    claimed = EmailNotifications.objects.filter(pk__in=[n.pk for n in notifications])
+    events = Event.objects.filter(pk__in=claimed.event_ids()).only('id', 'title').in_bulk()
+
+    if digest:
+        groups = [list(group) for _user_id, group in groupby(notifications, key=lambda n: n.user_id)]
+    else:
+        groups = [[notification] for notification in notifications]
+
+    messages, delivered, undeliverable = [], [], []
+    for group in groups:
+        ids = [notification.pk for notification in group]
+        if not group[0].user.email:
+            undeliverable.extend(ids)
+            continue
+        if digest:
+            messages.append(build_digest(group, events, connection))
+        else:
+            event = events.get((group[0].parameters or {}).get('event_id'))
+            messages.append(build_message(group[0], event, connection))
+        delivered.extend(ids)
+
+    try:
+        if messages:
+            connection.send_messages(messages)
+    except Exception:
+        logger.exception(f"Failed to send {len(messages)} emails, releasing their notifications")
+        release_notifications(delivered)
+        EmailNotifications.objects.filter(pk__in=undeliverable).update(
+            is_sent=True, claim_id=None, claimed_at=None,
+        )
+        return 0, 0, len(undeliverable), len(delivered)
+
+    EmailNotifications.objects.filter(pk__in=delivered + undeliverable).update(
+        is_sent=True, claim_id=None, claimed_at=None,
+    )
+    return len(delivered), len(messages), len(undeliverable), 0
+
+
+def dispatch_notifications(chunk_size=NOTIFICATION_CHUNK_SIZE, digest_chunk_size=DIGEST_CHUNK_SIZE):
+    """
+    Send every pending notification over a single email connection.
+
+    Notifications are claimed ``chunk_size`` at a time, rendered and handed
+    to the backend's ``send_messages()`` per chunk, reusing one open (SMTP)
+    connection for the whole run. With ``NOTIFICATION_DIGEST_MINUTES`` set,
+    wins, losses and balance updates then go out as one digest per user
+    whose window has elapsed. If sending a chunk fails its claims are
+    released and the run stops, leaving the rest for the next run.
+    Notifications of users without an email address are marked as sent.
+
+    Args:
+        chunk_size: Notifications claimed and sent together
+        digest_chunk_size: Users whose digests are claimed and sent together
+
+    Returns:
+        dict: ``sent``, ``skipped`` and ``failed`` notification counts,
+        ``emails`` sent and ``seconds`` taken
+    """
+    from .services import invalidate_unread_notification_counts
+
+    totals = {'sent': 0, 'emails': 0, 'skipped': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    # Settling the same event twice must not notify its gamblers twice
+    duplicates = EmailNotifications.objects.filter(
+        is_sent=False, claim_id__isnull=True, kind__in=EVENT_KINDS,
+    ).duplicates()
+    # Unread duplicates are counted in their users' cached inbox badges
+    unread_user_ids = set(duplicates.filter(is_read=False).values_list('user_id', flat=True))
+    removed, _ = duplicates.delete()
+    if removed:
+        invalidate_unread_notification_counts(unread_user_ids)
+        logger.warning(f"Dropped {removed} duplicate notifications")
+
+    passes = [(lambda: claim_notifications(chunk_size), False)]
+    if settings.NOTIFICATION_DIGEST_MINUTES:
+        passes.append((lambda: claim_digests(digest_chunk_size), True))
+
+    connection = get_connection()
+    with connection:
+        for claim, digest in passes:
+            while not totals['failed']:
+                notifications = claim()
+                if not notifications:
+                    break
+                sent, emails, skipped, failed = _deliver(connection, notifications, digest)
+                totals['sent'] += sent
+                totals['emails'] += emails
+                totals['skipped'] += skipped
+                totals['failed'] += failed
+
+    totals['seconds'] = time.perf_counter() - started
+    if totals['sent'] or totals['failed']:
+        logger.info(
+            f"Sent {totals['sent']} notifications in {totals['emails']} emails in {totals['seconds']:.2f}s "
+            f"({totals['emails'] / totals['seconds'] if totals['seconds'] else 0:.0f} emails/s), "
+            f"{totals['skipped']} skipped, {totals['failed']} failed"
+        )
+    return totals
@@ -0,0 +1,138 @@
+"""Keyset (cursor) pagination for querysets ordered by creation date."""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+
+# Cursors are signed, so only positions handed out by the paginator are
+# accepted and e.g. the page cache can't be flooded with made-up ones
+CURSOR_SALT = 'bets.cursor'
+
+
+class CursorPage:
+    """One page of results plus the cursors pointing to its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset newest first without COUNT or OFFSET queries.
+
+    Rows are ordered by ``field`` and then by primary key, both descending,
+    and each page is fetched with a ``WHERE (field, pk) < (cursor)`` filter
+    that the ``(..., -created_at)`` indexes can satisfy directly. Cursors are
+    opaque strings meant to be passed around in the query string.
+    """
+
+    def __init__(self, queryset, per_page, field='created_at'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+
+    def get_page(self, cursor=None):
+        """
+        Return the page a cursor points to, or the first page.
+
+        Invalid cursors are treated as no cursor at all.
+        """
+        queryset, make_page = self._plan(cursor)
+        return make_page(list(queryset))
+
+    async def aget_page(self, cursor=None):
+        """Async version of ``get_page``, for async views."""
+        queryset, make_page = self._plan(cursor)
+        return make_page([row async for row in queryset])
+
+    def _plan(self, cursor):
+        """Return the query for a page and the function building it from the rows."""
+        position = self._decode(cursor)
+        if position is None:
+            return self._forward(None, first=True)
+        value, pk, backwards = position
+        if backwards:
+            return self._backward((value, pk))
+        return self._forward((value, pk))
+
+    def _forward(self, position, first=False):
+        queryset = self.queryset.order_by(f'-{self.field}', '-pk')
+        if position is not None:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'pk__lt': pk})
+            )
+
+        def make_page(rows):
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return CursorPage(
+                rows,
+                next_cursor=self._encode(rows[-1]) if has_more else None,
+                previous_cursor=self._encode(rows[0], backwards=True) if rows and not first else None,
+            )
+        return queryset[:self.per_page + 1], make_page
+
+    def _backward(self, position):
+        value, pk = position
+        queryset = self.queryset.order_by(self.field, 'pk').filter(
+            Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'pk__gt': pk})
+        )
+
+        def make_page(rows):
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(
+                rows,
+                next_cursor=self._encode(rows[-1]) if rows else None,
+                previous_cursor=self._encode(rows[0], backwards=True) if has_more else None,
+            )
+        return queryset[:self.per_page + 1], make_page
+
+    def _encode(self, obj, backwards=False):
+        position = [getattr(obj, self.field).isoformat(), obj.pk, backwards]
+        cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+        return signing.Signer(salt=CURSOR_SALT).sign(cursor)
+
+    def _decode(self, cursor):
+        return decode_cursor(cursor)
+
+
+def decode_cursor(cursor):
+    """
+    Return the ``(value, pk, backwards)`` position of a cursor.
+
+    Returns:
+        tuple: The position, or None if the cursor is empty, malformed or
+        wasn't signed by ``CursorPaginator``
+    """
+    if not cursor:
+        return None
+    try:
+        cursor = signing.Signer(salt=CURSOR_SALT).unsign(cursor)
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk, backwards = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(value), int(pk), bool(backwards)
+    except (signing.BadSignature, ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
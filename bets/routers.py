@@ -0,0 +1,123 @@
+"""Routing of read-only queries to the read replica."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+# Set while the current request or task may read from the replica
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set while rendering something that outlives the request, which overrides
+# ``_replica_reads``
+_primary_reads = ContextVar('primary_reads', default=False)
+
+# Cookie that keeps a user on the primary for a while after they wrote
+STICKY_COOKIE = 'bets_primary'
+
+# Apps always read from the primary: a session or account created a moment
+# ago must be visible on the very next request
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'contenttypes'}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouter:
+    """
+    Send reads inside ``replica_reads()`` to ``DATABASE_REPLICA_ALIAS``.
+
+    Everything else, writes included, goes to the default database. Without
+    a replica configured every query goes to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return settings.DATABASE_REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds a copy of the same rows
+        return True
+
+
+@contextmanager
+def replica_reads():
+    """Read from the replica inside the block, if one is configured."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Read from the primary inside the block, even within ``replica_reads()``.
+
+    For pages that get cached: a replica lagging behind would put content
+    that was just invalidated back into the cache.
+    """
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def reading_from_replica():
+    """Whether reads are currently routed to the replica."""
+    return bool(settings.DATABASE_REPLICA_ALIAS and _replica_reads.get() and not _primary_reads.get())
+
+
+def read_from_replica(view):
+    """
+    Serve a read-only view from the replica.
+
+    Requests other than GET/HEAD, and users who wrote within the last
+    ``REPLICA_STICKY_SECONDS`` (see ``ReplicaStickinessMiddleware``), stay on
+    the primary so they always see their own bets and events.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES:
+                return await view(request, *args, **kwargs)
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """
+    Pin a user to the primary for ``REPLICA_STICKY_SECONDS`` after a write.
+
+    Any request with an unsafe method (placing a bet, creating an event, ...)
+    sets a short-lived cookie that ``read_from_replica`` honours, so the
+    pages that follow don't lag behind the replica. A cookie rather than a
+    cache key keeps this working with a per-process cache.
+    """
+
+    def process_response(self, request, response):
+        if settings.DATABASE_REPLICA_ALIAS and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
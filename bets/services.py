@@ -1,33 +1,75 @@
 """Betting service layer for business logic."""
 
 import logging
-from django.db import transaction
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Now, Round
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.translation import gettext as _
-from .models import Event, EventOption, Bet
+from django.contrib.auth.models import User
+from .caching import BET_COUNT_PAGES, invalidate_pages
+from .live import publish_odds
+from .models import Event, EventOption, Bet, DailyEventBets, Gambler, EmailNotifications
+from .routers import primary_reads
 
 logger = logging.getLogger('bets')
 
 
+MAX_BULK_BETS = 5000
+# Points staked by every bet; a winning bet pays ``odds * BET_STAKE_POINTS``
+BET_STAKE_POINTS = 100
+NOTIFICATION_BATCH_SIZE = 1000
+
+POPULAR_EVENTS_CACHE_KEY = "bets:popular-events"
+POPULAR_EVENTS_CACHE_TIMEOUT = 60 * 10
+POPULAR_EVENTS_WINDOW_DAYS = 7
+POPULAR_EVENTS_LIMIT = 240
+
+USER_STATS_CACHE_KEY = "bets:user-stats:{user_id}"
+USER_STATS_CACHE_TIMEOUT = 60 * 60
+UNREAD_NOTIFICATIONS_CACHE_KEY = "bets:unread-notifications:{user_id}"
+UNREAD_NOTIFICATIONS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
 class BettingError(Exception):
     """Base exception for betting operations."""
-    pass
+    code = 'error'
 
 
 class EventClosedError(BettingError):
     """Raised when trying to bet on a closed event."""
-    pass
+    code = 'event_closed'
 
 
 class InvalidOptionError(BettingError):
     """Raised when trying to bet on an invalid option."""
-    pass
+    code = 'invalid_option'
+
+
+class InvalidUserError(BettingError):
+    """Raised when a bulk bet references a user that doesn't exist."""
+    code = 'invalid_user'
 
 
 class DuplicateBetError(BettingError):
     """Raised when user tries to place multiple bets on same event."""
-    pass
+    code = 'duplicate'
+
+
+class EventNotClosedError(BettingError):
+    """Raised when trying to settle an event that is still open for betting."""
+    code = 'event_open'
+
+
+class AlreadySettledError(BettingError):
+    """Raised when trying to settle an event with a different winner."""
+    code = 'already_settled'
 
 
 def place_new_bet(user, event, option_id):
@@ -48,23 +90,21 @@ def place_new_bet(user, event, option_id):
         DuplicateBetError: If user already has a bet on this event
         ValidationError: For other validation errors
     """
-    # Validate event is still open for betting
-    if event.deadline <= timezone.now():
-        raise EventClosedError(_("This event has ended. No more bets can be placed."))
-    
-    # Validate option exists and belongs to this event
-    try:
-        option = EventOption.objects.get(id=option_id, event=event)
-    except EventOption.DoesNotExist:
-        raise InvalidOptionError(_("Invalid betting option selected."))
-    
-    # Check if user has already placed a bet on this event
-    if Bet.objects.filter(event=event, user=user).exists():
-        raise DuplicateBetError(_("You have already placed a bet on this event."))
-    
     try:
         with transaction.atomic():
-            # Create the bet - using field names as expected by current model
+            # Lock the option (and its event) so odds and deadline can't move under us
+            try:
+                option = EventOption.objects.select_for_update().select_related('event').get(
+                    id=option_id, event_id=event.pk
+                )
+            except (EventOption.DoesNotExist, ValueError, TypeError):
+                raise InvalidOptionError(_("Invalid betting option selected."))
+
+            # Validate event is still open for betting
+            if option.event.deadline <= timezone.now():
+                raise EventClosedError(_("This event has ended. No more bets can be placed."))
+
+            # Duplicates are rejected by the (event, user) unique constraint
             bet = Bet.objects.create(
                 event=event,
                 option=option,
@@ -72,13 +112,24 @@ def place_new_bet(user, event, option_id):
                 odds=option.current_odds
             )
 
-            # Update the odds for all options
-            _update_event_odds(event)
+            # Bump the denormalized tallies and update the odds for all options
+            _increment_bet_counters(event, option)
+            _record_daily_bets({event.pk: 1})
+            _refresh_event_odds(event)
+            transaction.on_commit(lambda: invalidate_pages(*BET_COUNT_PAGES))
+            transaction.on_commit(lambda: invalidate_user_stats([user.pk]))
 
             return bet
 
-    except ValidationError:
-        # Re-raise validation errors as-is
+    except IntegrityError:
+        # Only the (event, user) constraint means a duplicate; FK and NOT NULL
+        # failures, e.g. the event being deleted meanwhile, are real errors
+        if Bet.objects.filter(event_id=event.pk, user_id=user.pk).exists():
+            raise DuplicateBetError(_("You have already placed a bet on this event."))
+        logger.error(f"Integrity error placing bet for user {user.id} on event {event.id}", exc_info=True)
+        raise
+    except (BettingError, ValidationError):
+        # Re-raise betting and validation errors as-is
         raise
     except Exception as e:
         # Log unexpected errors with full context
@@ -86,6 +137,414 @@ def place_new_bet(user, event, option_id):
         raise ValidationError(_("An error occurred while placing your bet. Please try again."))
 
 
+def place_bulk_bets(items):
+    """
+    Place many bets at once, e.g. when importing them from a partner group chat.
+
+    Every item is validated with a handful of set-based queries, the valid
+    ones are inserted with a single ``bulk_create`` and the odds of each
+    affected event are recomputed once. Invalid items don't abort the batch.
+
+    Args:
+        items: Iterable of ``(user_id, event_id, option_id)`` tuples
+
+    Returns:
+        list: One entry per item, ``None`` if the bet was placed or the
+        ``BettingError`` explaining why it was rejected
+
+    Raises:
+        ValidationError: If the batch is too large or can't be stored
+    """
+    items = list(items)
+    if len(items) > MAX_BULK_BETS:
+        raise ValidationError(
+            _("Too many bets in one batch (max %(max)d).") % {'max': MAX_BULK_BETS}
+        )
+
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    try:
+        with transaction.atomic():
+            event_ids = {event_id for _user_id, event_id, _option_id in items}
+            # Lock the events so single bets can't race the duplicate check
+            events = {
+                event.pk: event
+                for event in Event.objects.select_for_update().filter(pk__in=event_ids).only('id', 'deadline')
+            }
+            options = {
+                option.pk: option
+                for option in EventOption.objects.filter(
+                    pk__in={option_id for _user_id, _event_id, option_id in items}
+                ).only('id', 'event_id', 'current_odds')
+            }
+            user_ids = set(User.objects.filter(
+                pk__in={user_id for user_id, _event_id, _option_id in items}
+            ).values_list('pk', flat=True))
+            taken = set(Bet.objects.filter(
+                event_id__in=events, user_id__in=user_ids
+            ).values_list('event_id', 'user_id'))
+
+            now = timezone.now()
+            new_bets = []
+            for index, (user_id, event_id, option_id) in enumerate(items):
+                event = events.get(event_id)
+                option = options.get(option_id)
+                if user_id not in user_ids:
+                    results[index] = InvalidUserError(_("Unknown user."))
+                elif event is None or option is None or option.event_id != event.pk:
+                    results[index] = InvalidOptionError(_("Invalid betting option selected."))
+                elif event.deadline <= now:
+                    results[index] = EventClosedError(_("This event has ended. No more bets can be placed."))
+                elif (event_id, user_id) in taken:
+                    results[index] = DuplicateBetError(_("You have already placed a bet on this event."))
+                else:
+                    taken.add((event_id, user_id))
+                    new_bets.append(Bet(
+                        event_id=event_id,
+                        option_id=option_id,
+                        user_id=user_id,
+                        odds=option.current_odds
+                    ))
+
+            Bet.objects.bulk_create(new_bets)
+
+            option_counts = Counter(bet.option_id for bet in new_bets)
+            event_counts = Counter(bet.event_id for bet in new_bets)
+            _add_bet_counts(EventOption.objects, option_counts)
+            _add_bet_counts(Event.objects, event_counts)
+            _record_daily_bets(event_counts)
+            for event_id in event_counts:
+                _refresh_event_odds(events[event_id])
+            if event_counts:
+                transaction.on_commit(lambda: invalidate_pages(*BET_COUNT_PAGES))
+                transaction.on_commit(lambda: invalidate_user_stats({bet.user_id for bet in new_bets}))
+
+    except Exception as e:
+        logger.error(f"Unexpected error placing {len(items)} bulk bets: {str(e)}", exc_info=True)
+        raise ValidationError(_("An error occurred while placing the bets. Please try again."))
+
+    return results
+
+
+def settle_event(event, winning_option_id):
+    """
+    Resolve an event and pay out every winning bet.
+
+    Each unsettled bet gets its ``payout`` (``odds * BET_STAKE_POINTS`` for
+    the winning option, 0 otherwise), winners' ``Gambler.points`` are credited
+    and a "WI"/"LO" notification is queued per bet. Everything runs in one
+    transaction with set-based queries, so the number of statements doesn't
+    grow with the number of bets. Settling again with the same winner only
+    pays out bets that weren't settled yet.
+
+    Args:
+        event: The Event instance to settle
+        winning_option_id: ID of the winning EventOption
+
+    Returns:
+        dict: Number of ``winners`` and ``losers`` settled and ``points`` paid
+
+    Raises:
+        EventNotClosedError: If the event is still open for betting
+        InvalidOptionError: If the option doesn't belong to the event
+        AlreadySettledError: If the event was settled with another winner
+    """
+    with transaction.atomic():
+        event = Event.objects.select_for_update().get(pk=event.pk)
+        if event.deadline > timezone.now():
+            raise EventNotClosedError(_("This event is still open for betting."))
+
+        try:
+            winner = EventOption.objects.get(id=winning_option_id, event=event)
+        except (EventOption.DoesNotExist, ValueError, TypeError):
+            raise InvalidOptionError(_("Invalid betting option selected."))
+
+        if event.winner_id is not None and event.winner_id != winner.pk:
+            raise AlreadySettledError(_("This event has already been settled."))
+
+        if event.winner_id is None:
+            Event.objects.filter(pk=event.pk).update(winner=winner, updated_at=Now())
+            event.winner = winner
+        # The winner may have been picked in the admin, which doesn't flag the
+        # options; only options whose flag is wrong are touched
+        event.options.exclude(is_winner=Q(pk=winner.pk)).update(is_winner=Q(pk=winner.pk), updated_at=Now())
+
+        unsettled = Bet.objects.filter(event=event, payout__isnull=True)
+        winning_payout = Cast(Round(F('odds') * BET_STAKE_POINTS), IntegerField())
+
+        # Credit winners in one UPDATE; (event, user) is unique so each
+        # gambler has at most one winning bet here
+        Gambler.objects.filter(
+            user__in=unsettled.filter(option=winner).values('user_id')
+        ).update(
+            points=F('points') + Subquery(
+                unsettled.filter(option=winner, user=OuterRef('user_id')).annotate(
+                    amount=winning_payout
+                ).values('amount')[:1]
+            ),
+            updated_at=Now(),
+        )
+
+        notifications = []
+        settled_users = []
+        summary = {'winners': 0, 'losers': 0, 'points': 0}
+        for user_id, option_id, odds in unsettled.values_list('user_id', 'option_id', 'odds').iterator():
+            if option_id == winner.pk:
+                payout = int(odds * BET_STAKE_POINTS)
+                summary['winners'] += 1
+                summary['points'] += payout
+                kind = "WI"
+            else:
+                payout = 0
+                summary['losers'] += 1
+                kind = "LO"
+            settled_users.append(user_id)
+            notifications.append(EmailNotifications(
+                user_id=user_id,
+                kind=kind,
+                parameters={'event_id': event.pk, 'payout': payout},
+            ))
+        EmailNotifications.objects.bulk_create(notifications, batch_size=NOTIFICATION_BATCH_SIZE)
+
+        unsettled.update(payout=Case(
+            When(option=winner, then=winning_payout),
+            default=Value(0),
+        ))
+        transaction.on_commit(lambda: invalidate_user_stats(settled_users))
+        transaction.on_commit(lambda: invalidate_unread_notification_counts(settled_users))
+
+    logger.info(
+        f"Settled event {event.pk}: {summary['winners']} winners, "
+        f"{summary['losers']} losers, {summary['points']} points paid"
+    )
+    return summary
+
+
+def get_user_stats(user):
+    """
+    Return a user's betting statistics, cached until their bets change.
+
+    Computed in one query with a correlated subquery per figure, so the
+    cost doesn't depend on how many events or bets the user has. Read from
+    the primary, as a lagging replica would cache stale figures for an hour.
+
+    Returns:
+        dict: ``events_created``, ``bets_placed``, ``wins``, ``losses``
+        and ``points_won``
+    """
+    key = USER_STATS_CACHE_KEY.format(user_id=user.pk)
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    def total(queryset, group_by, aggregate):
+        return Coalesce(Subquery(
+            queryset.order_by().values(group_by).annotate(total=aggregate).values('total')
+        ), 0)
+
+    bets = Bet.objects.filter(user=OuterRef('pk'))
+    with primary_reads():
+        stats = User.objects.filter(pk=user.pk).values(
+            events_created=total(Event.objects.filter(creator=OuterRef('pk')), 'creator', Count('pk')),
+            bets_placed=total(bets, 'user', Count('pk')),
+            wins=total(bets.filter(payout__gt=0), 'user', Count('pk')),
+            losses=total(bets.filter(payout=0), 'user', Count('pk')),
+            points_won=total(bets, 'user', Sum('payout')),
+        ).get()
+
+    cache.set(key, stats, USER_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_user_stats(user_ids):
+    """Drop the cached statistics of the given users."""
+    cache.delete_many([USER_STATS_CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def get_unread_notification_count(user):
+    """
+    Return how many unread notifications a user has.
+
+    The count is cached per user and kept up to date as notifications are
+    created and read, so page loads don't touch the notifications table.
+    On a miss it is counted from the (user, is_read, created_at) index on
+    the primary, even on replica-routed pages: a lagging replica would pin
+    a count that was just reset for a day.
+    """
+    key = UNREAD_NOTIFICATIONS_CACHE_KEY.format(user_id=user.pk)
+    count = cache.get(key)
+    if count is None:
+        with primary_reads():
+            count = EmailNotifications.objects.filter(user=user, is_read=False).count()
+        cache.set(key, count, UNREAD_NOTIFICATIONS_CACHE_TIMEOUT)
+    return count
+
+
+def increment_unread_notification_count(user_id, count=1):
+    """Add new notifications to a user's cached unread count, if cached."""
+    try:
+        cache.incr(UNREAD_NOTIFICATIONS_CACHE_KEY.format(user_id=user_id), count)
+    except ValueError:
+        # Not cached; the next read counts from the database
+        pass
+
+
+def invalidate_unread_notification_counts(user_ids):
+    """Drop the cached unread counts of the given users, e.g. after a bulk insert."""
+    cache.delete_many([UNREAD_NOTIFICATIONS_CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def mark_notifications_read(user, notification_ids=None):
+    """
+    Mark a user's notifications as read in a single UPDATE.
+
+    Args:
+        user: Owner of the notifications
+        notification_ids: Notifications to mark, or None for all of them
+
+    Returns:
+        int: Number of notifications that were unread
+    """
+    unread = EmailNotifications.objects.filter(user=user, is_read=False)
+    if notification_ids is not None:
+        unread = unread.filter(pk__in=notification_ids)
+    updated = unread.update(is_read=True)
+
+    key = UNREAD_NOTIFICATIONS_CACHE_KEY.format(user_id=user.pk)
+    if notification_ids is None:
+        transaction.on_commit(lambda: cache.set(key, 0, UNREAD_NOTIFICATIONS_CACHE_TIMEOUT))
+    elif updated:
+        transaction.on_commit(lambda: cache.delete(key))
+    return updated
+
+
+def _add_bet_counts(queryset, counts, key='pk', field='bet_count'):
+    """
+    Add per-row bet counts to a counter column in one UPDATE.
+
+    Args:
+        queryset: Rows to update, e.g. ``Event.objects``
+        counts: Mapping of ``key`` value to the number of bets to add
+        key: Column identifying the row each count belongs to
+        field: Counter column to increment
+    """
+    if not counts:
+        return
+    queryset.filter(**{f'{key}__in': counts}).update(**{
+        field: F(field) + Case(
+            *[When(**{key: value}, then=Value(count)) for value, count in counts.items()],
+            default=Value(0),
+        )
+    })
+
+
+def _record_daily_bets(event_counts):
+    """
+    Add bets to today's per-event buckets used to rank popular events.
+
+    Args:
+        event_counts: Mapping of event id to the number of new bets
+    """
+    if not event_counts:
+        return
+    today = timezone.now().date()
+    DailyEventBets.objects.bulk_create(
+        [DailyEventBets(event_id=event_id, day=today) for event_id in event_counts],
+        ignore_conflicts=True,
+    )
+    _add_bet_counts(DailyEventBets.objects.filter(day=today), event_counts, key='event_id', field='bets')
+
+
+def get_popular_events(user=None):
+    """
+    Return the ranking of public events by bets placed in the last days.
+
+    The ranking is read from the cache and rebuilt from the daily buckets
+    on a miss; ``refresh_popular_events`` keeps it warm. A logged in user's
+    own private events are ranked in on every call, as they can't be shared.
+
+    Args:
+        user (User, optional): The user viewing the ranking
+
+    Returns:
+        list: ``(event_id, recent_bet_count)`` pairs, most popular first
+    """
+    ranking = cache.get(POPULAR_EVENTS_CACHE_KEY)
+    if ranking is None:
+        ranking = refresh_popular_events()
+
+    if user is not None and user.is_authenticated:
+        own_events = [
+            (row['event_id'], row['total'])
+            for row in DailyEventBets.objects.filter(
+                day__gte=_popular_events_since(), event__creator=user, event__is_public=False
+            ).values('event_id').annotate(total=Sum('bets'))
+        ]
+        if own_events:
+            ranking = sorted(ranking + own_events, key=lambda pair: (pair[1], pair[0]), reverse=True)
+    return ranking
+
+
+def refresh_popular_events():
+    """
+    Rebuild the cached popular events ranking and drop expired daily buckets.
+
+    The buckets are read from the primary so the cached ranking doesn't
+    lag behind the bets.
+
+    Returns:
+        list: The new ranking, as returned by ``get_popular_events``
+    """
+    since = _popular_events_since()
+    with primary_reads():
+        ranking = [
+            (row['event_id'], row['total'])
+            for row in DailyEventBets.objects.filter(
+                day__gte=since, event__is_public=True
+            ).values('event_id').annotate(total=Sum('bets')).order_by('-total', '-event_id')[:POPULAR_EVENTS_LIMIT]
+        ]
+    cache.set(POPULAR_EVENTS_CACHE_KEY, ranking, POPULAR_EVENTS_CACHE_TIMEOUT)
+    invalidate_pages('popular_events')
+    DailyEventBets.objects.filter(day__lt=since).delete()
+    return ranking
+
+
+def _popular_events_since():
+    return timezone.now().date() - timedelta(days=POPULAR_EVENTS_WINDOW_DAYS - 1)
+
+
+def invalidate_popular_events():
+    """Drop the cached popular events ranking so the next read rebuilds it."""
+    cache.delete(POPULAR_EVENTS_CACHE_KEY)
+
+
+def _increment_bet_counters(event, option, count=1):
+    """
+    Add ``count`` bets to the denormalized tallies of an event and one of its options.
+
+    Uses ``F()`` expressions so concurrent bets never lose an increment.
+    """
+    EventOption.objects.filter(pk=option.pk).update(bet_count=F('bet_count') + count)
+    Event.objects.filter(pk=event.pk).update(bet_count=F('bet_count') + count)
+
+
+def _refresh_event_odds(event):
+    """
+    Update the odds of an event after new bets, now or debounced via Celery.
+
+    With ``ODDS_RECALC_DEBOUNCE_SECONDS`` set, the recalculation is queued once
+    the bet transaction commits, so the request doesn't wait for it.
+    """
+    if not settings.ODDS_RECALC_DEBOUNCE_SECONDS:
+        _update_event_odds(event)
+        return
+
+    from .tasks import schedule_event_odds_update
+    transaction.on_commit(lambda: schedule_event_odds_update(event.pk))
+
+
 def _update_event_odds(event):
     """
     Update odds for all options in an event based on current bet distribution.
@@ -93,25 +552,39 @@ def _update_event_odds(event):
     The odds are calculated inversely proportional to the number of bets.
     More bets = lower odds (lower payout), fewer bets = higher odds (higher payout).
 
+    Odds are derived from the ``bet_count`` tallies kept on ``Event`` and
+    ``EventOption``, so the whole recalculation is a single UPDATE statement
+    no matter how many bets or options the event has.
+
     Args:
-        event: The Event instance to update odds for
+        event: The Event instance (or its id) to update odds for
     """
-    total_bets = Bet.objects.filter(event=event).count()
-
-    if total_bets == 0:
-        # No bets yet, keep initial odds
-        return
-
-    for option in event.options.all():
-        option_bets = option.bets.count()
+    odds_field = EventOption._meta.get_field('current_odds')
+    total_bets = Subquery(
+        Event.objects.filter(pk=OuterRef('event_id')).values('bet_count')[:1]
+    )
 
-        if option_bets > 0:
-            # Calculate odds based on bet distribution
+    EventOption.objects.filter(event=event, event__bet_count__gt=0).update(
+        current_odds=Case(
             # Odds increase when fewer people bet on this option
-            option.current_odds = total_bets / option_bets
-        else:
+            When(
+                bet_count__gt=0,
+                then=Cast(
+                    Cast(total_bets, FloatField()) / F('bet_count'),
+                    DecimalField(max_digits=odds_field.max_digits, decimal_places=odds_field.decimal_places),
+                ),
+            ),
             # No bets on this option yet - use maximum odds based on total bets
             # or keep initial odds, whichever is higher
-            option.current_odds = max(float(option.initial_odds), total_bets * 2.0)
+            default=Greatest(
+                F('initial_odds'),
+                Cast(total_bets * 2, DecimalField(max_digits=odds_field.max_digits, decimal_places=odds_field.decimal_places)),
+            ),
+            output_field=odds_field,
+        ),
+        updated_at=Now(),
+    )
 
-        option.save()
\ No newline at end of file
+    # Push the new odds to the event's watchers once they are committed
+    event_id = getattr(event, 'pk', event)
+    transaction.on_commit(lambda: publish_odds(event_id))
@@ -0,0 +1,27 @@
+"""Signal handlers keeping cached data in sync with the models."""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import LISTING_PAGES, invalidate_pages
+from .models import EmailNotifications, Event
+from .services import increment_unread_notification_count, invalidate_popular_events, invalidate_user_stats
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    """Drop the popular ranking and cached listings when an event is saved or removed."""
+    invalidate_popular_events()
+    invalidate_pages(*LISTING_PAGES)
+    if kwargs.get('created', True):
+        # A new or deleted event changes its creator's event count
+        invalidate_user_stats([instance.creator_id])
+
+
+@receiver(post_save, sender=EmailNotifications)
+def notification_created(sender, instance, created, **kwargs):
+    """Count a new notification in its user's cached unread count."""
+    if created and not instance.is_read:
+        transaction.on_commit(lambda: increment_unread_notification_count(instance.user_id))
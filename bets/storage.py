@@ -0,0 +1,74 @@
+"""Content-addressed media storage for event images."""
+
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """
+    Return the SHA-256 hex digest of a file, reading it in chunks.
+
+    Args:
+        content: Django ``File``; ``chunks()`` rewinds it before reading
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names files after the SHA-256 of their bytes.
+
+    Files land in ``<prefix>/<aa>/<bb>/<digest><ext>``, whatever name they
+    were saved under, so identical uploads share a single blob. Saving
+    content that is already stored only touches its modification time and
+    returns the existing name. Blobs may be shared by several rows, so they are never deleted
+    by the models; ``collect_image_blobs`` removes unreferenced ones.
+    """
+
+    def __init__(self, prefix='blobs', **kwargs):
+        self.prefix = prefix
+        super().__init__(**kwargs)
+
+    def blob_name(self, digest, ext=''):
+        """Return the storage name of the blob with ``digest``."""
+        return posixpath.join(self.prefix, digest[:2], digest[2:4], f"{digest}{ext.lower()}")
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save, never made unique
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1]
+        name = self.blob_name(content_hash(content), ext)
+        try:
+            # Reusing a blob restarts collect_image_blobs' grace period, as
+            # the row about to reference it may not be committed yet
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+
+        # Write under a private name and rename into place, so a concurrent
+        # save of the same bytes never sees a half-written blob
+        temp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+
+def select_event_image_storage():
+    """Storage for event images, configurable through ``STORAGES``."""
+    return storages['event_images']
@@ -1,8 +1,22 @@
 from datetime import date
+import logging
+import os
+
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .models import Gambler
+from .caching import LISTING_PAGES, invalidate_pages
+from .models import Bet, Event, EventImageDerivative, Gambler
+
+logger = logging.getLogger('bets')
+
+ODDS_RECALC_KEY = "bets:odds-recalc:{event_id}"
+SETTLEMENT_CHUNK_SIZE = 100
 
 
 @shared_task
@@ -23,3 +37,201 @@ def check_expired_subscriptions():
     count = expired_gamblers.update(status="EX")
     
     return f"Updated {count} gamblers to Expired status"
+
+
+@shared_task
+def settle_finished_events():
+    """
+    Settle events past their deadline that have a winner but unsettled bets.
+
+    Events are walked in chunks ordered by id (keyset pagination), and each
+    one is settled in its own transaction, so a large backlog drains without
+    long locks or loading every event at once.
+    """
+    from .services import settle_event, BettingError
+
+    now = timezone.now()
+    pending = Event.objects.filter(
+        Exists(Bet.objects.filter(event=OuterRef('pk'), payout__isnull=True)),
+        deadline__lte=now,
+        winner__isnull=False,
+    ).only('id', 'winner_id').order_by('id')
+
+    settled = failed = 0
+    last_id = 0
+    while True:
+        chunk = list(pending.filter(id__gt=last_id)[:SETTLEMENT_CHUNK_SIZE])
+        if not chunk:
+            break
+
+        for event in chunk:
+            try:
+                settle_event(event, event.winner_id)
+                settled += 1
+            except BettingError as e:
+                failed += 1
+                logger.warning(f"Could not settle event {event.pk}: {str(e)}")
+        last_id = chunk[-1].pk
+
+    return f"Settled {settled} events, {failed} failed"
+
+
+@shared_task
+def refresh_popular_events():
+    """
+    Rebuild the cached ranking of popular events from the daily bet buckets.
+    """
+    from .services import refresh_popular_events as refresh
+
+    ranking = refresh()
+
+    return f"Ranked {len(ranking)} popular events"
+
+
+@shared_task
+def send_pending_notifications():
+    """
+    Email every unsent notification, reusing one connection for the run.
+
+    Rows are claimed in chunks, so several workers can run this at once
+    without sending a notification twice. In digest mode wins, losses and
+    balance updates are merged into one email per user.
+    """
+    from .notifications import dispatch_notifications
+
+    result = dispatch_notifications()
+    rate = result['emails'] / result['seconds'] if result['seconds'] else 0
+
+    return (
+        f"Sent {result['sent']} notifications in {result['emails']} emails "
+        f"in {result['seconds']:.2f}s ({rate:.0f} emails/s), "
+        f"{result['skipped']} skipped, {result['failed']} failed"
+    )
+
+
+@shared_task
+def process_event_image(event_id):
+    """
+    Resize a freshly uploaded event image and swap it into ``Event.image``.
+
+    The upload is decoded once to produce both the 300x300 JPEG kept in
+    ``image`` and the responsive derivatives used for ``srcset``. The upload
+    stays in ``original_image``. If the image can't be processed the
+    original is kept as the event image, as before.
+
+    Event images are content-addressed, so an upload identical to one
+    already processed for another event reuses that event's copies
+    without decoding anything.
+    """
+    from .images import EXTENSIONS, generate_derivatives, open_image, resize_image
+
+    event = Event.objects.filter(pk=event_id).only('id', 'title', 'image', 'image_ready').first()
+    if event is None or not event.image or event.image_ready:
+        return f"Nothing to process for event {event_id}"
+
+    original_name = event.image.name
+    processed = (
+        Event.objects.filter(original_image=original_name, image_ready=True)
+        .exclude(pk=event_id)
+        .only('id', 'image')
+        .prefetch_related('image_derivatives')
+        .first()
+    )
+    if processed is not None:
+        resized_name = processed.image.name
+        rows = [
+            EventImageDerivative(
+                event_id=event_id,
+                format=derivative.format,
+                width=derivative.width,
+                height=derivative.height,
+                image=derivative.image.name,
+            )
+            for derivative in processed.image_derivatives.all()
+        ]
+    else:
+        try:
+            with event.image.open('rb') as original:
+                img = open_image(original)
+            resized = resize_image(img)
+            derivatives = generate_derivatives(img)
+        except Exception as e:
+            # If image processing fails, log the error and keep the original image
+            logger.warning(f"Failed to process image for event '{event.title}': {str(e)}")
+            Event.objects.filter(pk=event_id, image=original_name).update(image_ready=True)
+            return f"Kept original image for event {event_id}"
+
+        storage = event.image.storage
+        basename = os.path.splitext(os.path.basename(original_name))[0]
+        resized_name = storage.save(
+            event.image.field.generate_filename(event, f"resized_{basename}.jpg"), resized
+        )
+        derivative_field = EventImageDerivative._meta.get_field('image')
+        rows = [
+            EventImageDerivative(
+                event_id=event_id,
+                format=derivative.format,
+                width=derivative.width,
+                height=derivative.height,
+                image=storage.save(
+                    derivative_field.generate_filename(
+                        None, f"{basename}_{derivative.width}w.{EXTENSIONS[derivative.format]}"
+                    ),
+                    derivative.content,
+                ),
+            )
+            for derivative in derivatives
+        ]
+
+    # Blobs may be shared with other events, so replaced files are left for
+    # the collect_image_blobs command instead of being deleted here
+    with transaction.atomic():
+        # Only swap if no newer upload replaced the image in the meantime
+        swapped = Event.objects.filter(pk=event_id, image=original_name).update(
+            image=resized_name,
+            original_image=original_name,
+            image_ready=True,
+        )
+        if swapped:
+            EventImageDerivative.objects.filter(event_id=event_id).delete()
+            EventImageDerivative.objects.bulk_create(rows)
+            # update() sends no post_save, so expire the cached listings here
+            transaction.on_commit(lambda: invalidate_pages(*LISTING_PAGES))
+
+    if not swapped:
+        return f"Image for event {event_id} was replaced while processing"
+    if processed is not None:
+        return f"Reused processed image of event {processed.pk} for event {event_id}"
+    return f"Processed image for event {event_id} with {len(rows)} derivatives"
+
+
+def schedule_event_odds_update(event_id):
+    """
+    Queue an odds recalculation for an event unless one is already pending.
+
+    All bets landing within ``ODDS_RECALC_DEBOUNCE_SECONDS`` of the first one
+    are coalesced into a single run of ``update_event_odds``.
+    """
+    window = settings.ODDS_RECALC_DEBOUNCE_SECONDS
+    key = ODDS_RECALC_KEY.format(event_id=event_id)
+    if cache.add(key, True, timeout=window * 2):
+        try:
+            update_event_odds.apply_async(args=[event_id], countdown=window)
+        except Exception:
+            # Nothing was queued, let the next bet try again
+            cache.delete(key)
+            raise
+
+
+@shared_task
+def update_event_odds(event_id):
+    """
+    Recalculate the odds of an event from its bet counters.
+    """
+    from .services import _update_event_odds
+
+    # Clear the flag first so bets arriving from now on schedule a new run
+    cache.delete(ODDS_RECALC_KEY.format(event_id=event_id))
+    _update_event_odds(event_id)
+
+    return f"Updated odds for event {event_id}"
@@ -0,0 +1,111 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from bets.images import MIME_TYPES
+
+register = template.Library()
+
+
+def _derivatives_by_format(event):
+    """
+    Group an event's derivatives by format, narrowest first.
+
+    Reads ``event.image_derivatives.all()`` so views can prefetch them.
+    """
+    if not event.image or not event.image_ready:
+        return {}
+    grouped = {}
+    for derivative in sorted(event.image_derivatives.all(), key=lambda d: d.width):
+        grouped.setdefault(derivative.format, []).append(derivative)
+    return grouped
+
+
+def _srcset(derivatives):
+    return ", ".join(f"{d.image.url} {d.width}w" for d in derivatives)
+
+
+@register.simple_tag
+def event_srcset(event, format='webp'):
+    """
+    Return the ``srcset`` value for one format of an event image.
+
+    Usage in template:
+    <img srcset="{% event_srcset event 'webp' %}" ...>
+    """
+    return _srcset(_derivatives_by_format(event).get(format, []))
+
+
+@register.simple_tag
+def event_picture(event, sizes='100vw', css_class=''):
+    """
+    Render a ``<picture>`` that lets the browser pick the smallest adequate
+    derivative, preferring AVIF, then WebP, then JPEG.
+
+    Events processed before derivatives existed fall back to a plain
+    ``<img>`` of the stored image.
+
+    Usage in template:
+    {% event_picture event sizes="(min-width: 1024px) 66vw, 100vw" %}
+    """
+    if not event.image or not event.image_ready:
+        return ''
+
+    grouped = _derivatives_by_format(event)
+    sources = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES[fmt], _srcset(grouped[fmt]), sizes)
+            for fmt in MIME_TYPES
+            if fmt in grouped and fmt != 'jpeg'
+        ),
+    )
+    fallback = grouped.get('jpeg')
+    if fallback:
+        img = format_html(
+            '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy">',
+            fallback[-1].image.url, _srcset(fallback), sizes,
+            fallback[-1].width, fallback[-1].height, event.title, css_class,
+        )
+    else:
+        img = format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy">',
+            event.image.url, event.title, css_class,
+        )
+    return format_html('<picture>{}{}</picture>', sources, img)
+
+
+@register.simple_tag
+def event_background(event, width=640):
+    """
+    Return CSS declarations for an event image used as a background.
+
+    Picks the narrowest derivative at least ``width`` pixels wide and offers
+    it in every format through ``image-set()``; browsers without
+    ``image-set()`` support keep the plain JPEG declaration before it.
+
+    Usage in template:
+    <div style="{% event_background event 640 %}">
+    """
+    if not event.image or not event.image_ready:
+        return ''
+
+    grouped = _derivatives_by_format(event)
+    if not grouped:
+        return format_html("background-image: url('{}');", event.image.url)
+
+    candidates = []
+    for fmt in MIME_TYPES:
+        derivatives = grouped.get(fmt)
+        if derivatives:
+            chosen = next((d for d in derivatives if d.width >= width), derivatives[-1])
+            candidates.append((fmt, chosen))
+
+    fallback = dict(candidates).get('jpeg', candidates[-1][1])
+    image_set = ", ".join(
+        f"url('{chosen.image.url}') type('{MIME_TYPES[fmt]}')" for fmt, chosen in candidates
+    )
+    return format_html(
+        "background-image: url('{}'); background-image: image-set({});",
+        fallback.image.url, image_set,
+    )
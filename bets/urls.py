@@ -1,18 +1,33 @@
+from django.conf import settings
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 
 from . import views
 
+# Sync views under WSGI, async ones under ASGI (see ASYNC_VIEWS)
+if settings.ASYNC_VIEWS:
+    home, latest_events, popular_events, event_detail = (
+        views.ahome, views.alatest_events, views.apopular_events, views.aevent_detail
+    )
+else:
+    home, latest_events, popular_events, event_detail = (
+        views.home, views.latest_events, views.popular_events, views.event_detail
+    )
+
 urlpatterns = [
-    path("", views.home, name="home"),
+    path("", home, name="home"),
     path("about/", views.about, name="about"),
     path("create_event/", views.create_event, name="create_event"),
     path("edit_event/<int:event_id>", views.edit_event, name="edit_event"),
-    path("latest_events/", views.latest_events, name="latest_events"),
-    path("popular_events/", views.popular_events, name="popular_events"),
-    path("event/<int:event_id>/", views.event_detail, name="event_detail"),
+    path("latest_events/", latest_events, name="latest_events"),
+    path("popular_events/", popular_events, name="popular_events"),
+    path("event/<int:event_id>/", event_detail, name="event_detail"),
     path("place_bet/<int:event_id>/", views.place_bet, name="place_bet"),
+    path("place_bets/bulk/", views.place_bets_bulk, name="place_bets_bulk"),
     path("my_bets/", views.my_bets, name="my_bets"),
+    path("notifications/", views.notifications, name="notifications"),
+    path("notifications/read/", views.mark_all_notifications_read, name="mark_all_notifications_read"),
+    path("stats/page-cache/", views.page_cache_status, name="page_cache_status"),
     path("privacy-policy/", views.privacy_policy, name="privacy_policy"),
     path("contact/", views.contact, name="contact"),
     path("accounts/logout/", auth_views.LogoutView.as_view(next_page='home'), name="logout"),
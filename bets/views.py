@@ -1,4 +1,5 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import logout, login, authenticate
 from django.contrib import messages
 from django.conf import settings
@@ -9,33 +10,61 @@ from django.contrib.auth.models import User
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
+from .caching import cache_anonymous_page, page_cache_stats
+from .pagination import CursorPaginator
+from .routers import read_from_replica
 from .forms import ImageUploadForm, EventOptionForm, LoginForm, CustomEventOptionFormSet, UserRegistrationForm
-from .models import Event, EventOption, Gambler, Bet
-from django.db.models import Count, Q
+from .models import Event, EventOption, Gambler, Bet, EmailNotifications
+from django.db.models import Count, Prefetch, Q, prefetch_related_objects
 from django.core.paginator import Paginator
-from datetime import timedelta
+import json
 import logging
 
 logger = logging.getLogger('bets')
 
 
+def _prefetch_image_derivatives(events):
+    """Load the responsive image copies of the events that have a ready image"""
+    prefetch_related_objects(
+        [event for event in events if event.image and event.image_ready],
+        'image_derivatives',
+    )
+
+
+async def _aprefetch_image_derivatives(events):
+    await sync_to_async(_prefetch_image_derivatives)(events)
+
+
+async def _arender(request, template_name, context):
+    """
+    Render a template from an async view.
+
+    Django templates render synchronously, so async views load every row
+    before calling this and the rendering itself runs in a worker thread.
+    The user is loaded here without blocking, so context processors reuse it.
+    """
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@cache_anonymous_page('home')
+@read_from_replica
 def home(request):
     """Home page view showing popular events"""
-    # Get events with the most bets in the last 7 days
-    recent_date = timezone.now() - timedelta(days=7)
     events = Event.objects.filter(
         Q(is_public=True),
-    )    
+    )
 
     # Paginate events
-    paginator = Paginator(events, 12)  # Show 12 events per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+    paginator = CursorPaginator(events, 12)  # Show 12 events per page
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    _prefetch_image_derivatives(page_obj)
+
     context = {
         'events': page_obj,
         'title': _('Popular Events'),
@@ -45,6 +74,28 @@ def home(request):
     return render(request, 'event_list.html', context)
 
 
+@cache_anonymous_page('home')
+@read_from_replica
+async def ahome(request):
+    """Async ``home``, served when ``ASYNC_VIEWS`` is on"""
+    events = Event.objects.filter(
+        Q(is_public=True),
+    )
+
+    # Paginate events
+    paginator = CursorPaginator(events, 12)  # Show 12 events per page
+    page_obj = await paginator.aget_page(request.GET.get('cursor'))
+    await _aprefetch_image_derivatives(page_obj)
+
+    context = {
+        'events': page_obj,
+        'title': _('Popular Events'),
+        'show_bet_count': True,
+        'show_event_count': False,
+    }
+    return await _arender(request, 'event_list.html', context)
+
+
 def about(request):
     return render(request, "about.html")
 
@@ -132,18 +183,23 @@ def all_services(request):
 
 
 @login_required
+@read_from_replica
 def profile(request):
+    from .services import get_user_stats
+
     user = request.user
-    created_events = Event.objects.filter(creator=user).select_related('creator').order_by('-created_at')
-    user_bets = Bet.objects.filter(user=user).select_related('event', 'option').order_by('-created_at')
+    created_events = Event.objects.filter(creator=user).only(
+        'id', 'title', 'description', 'image', 'image_ready', 'deadline', 'created_at'
+    )
+    user_bets = Bet.objects.filter(user=user).select_related('event', 'option').only(
+        'id', 'payout', 'created_at', 'event__id', 'event__title', 'option__id', 'option__title'
+    )
 
     context = {
         'user': user,
-        'created_events': created_events,
-        'user_bets': user_bets,
-        'total_events': created_events.count(),
-        'total_bets': user_bets.count(),
-        'winning_bets': user_bets.filter(option__is_winner=True).count(),
+        'created_events': CursorPaginator(created_events, 10).get_page(request.GET.get('events_cursor')),
+        'user_bets': CursorPaginator(user_bets, 20).get_page(request.GET.get('bets_cursor')),
+        'stats': get_user_stats(user),
     }
 
     return render(request, 'profile.html', context)
@@ -201,22 +257,49 @@ EventOptionFormSet = inlineformset_factory(
 )
 
 
-@login_required
-def event_detail(request, event_id):
-    event = get_object_or_404(Event, id=event_id)
-    options = event.options.all()
-    user_bet = None
-    if request.user.is_authenticated:
-        user_bet = Bet.objects.filter(event=event, user=request.user).first()
-    
+def _event_detail_context(request, event, user):
     context = {
         'event': event,
-        'options': options,
-        'user_bet': user_bet,
+        'options': event.options.all(),
+        'user_bet': event.user_bets[0] if event.user_bets else None,
         'can_bet': event.deadline > timezone.now(),
-        'is_creator': event.creator == request.user,
+        'is_creator': event.creator_id == user.pk,
     }
-    return render(request, 'event_detail.html', context)
+    # Live odds are only streamed by the ASGI application (see bets.live);
+    # under WSGI every open page would hold a worker
+    if context['can_bet'] and settings.LIVE_ODDS_BACKEND != 'none' and isinstance(request, ASGIRequest):
+        from .live import odds_stream_url
+        context['live_odds_url'] = odds_stream_url(event.pk, user.pk)
+    return context
+
+
+def _event_detail_queryset(user):
+    # Event, creator, options and the user's bet in a fixed number of queries;
+    # option bet counts come from the denormalized ``bet_count`` tallies
+    return Event.objects.select_related('creator').prefetch_related(
+        Prefetch('options', queryset=EventOption.objects.order_by('id')),
+        Prefetch(
+            'bets',
+            queryset=Bet.objects.filter(user=user).select_related('option'),
+            to_attr='user_bets',
+        ),
+    )
+
+
+@login_required
+def event_detail(request, event_id):
+    event = get_object_or_404(_event_detail_queryset(request.user), id=event_id)
+    _prefetch_image_derivatives([event])
+    return render(request, 'event_detail.html', _event_detail_context(request, event, request.user))
+
+
+@login_required
+async def aevent_detail(request, event_id):
+    """Async ``event_detail``, served when ``ASYNC_VIEWS`` is on"""
+    user = await request.auser()
+    event = await aget_object_or_404(_event_detail_queryset(user), id=event_id)
+    await _aprefetch_image_derivatives([event])
+    return await _arender(request, 'event_detail.html', _event_detail_context(request, event, user))
 
 
 @login_required
@@ -252,44 +335,119 @@ def place_bet(request, event_id):
 
 
 @login_required
+@require_POST
+def place_bets_bulk(request):
+    """
+    JSON endpoint for bulk bet imports.
+
+    Expects ``{"bets": [{"user": id, "event": id, "option": id}, ...]}`` and
+    answers with the outcome of every item, in the same order.
+    """
+    from .services import place_bulk_bets
+
+    if not request.user.is_staff:
+        return HttpResponseForbidden(_("You don't have permission to import bets."))
+
+    try:
+        payload = json.loads(request.body)
+        items = [(int(bet['user']), int(bet['event']), int(bet['option'])) for bet in payload['bets']]
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': _("Invalid request body.")}, status=400)
+
+    try:
+        errors = place_bulk_bets(items)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+
+    results = [
+        {'index': index, 'status': 'placed'} if error is None else
+        {'index': index, 'status': 'rejected', 'error': error.code, 'message': str(error)}
+        for index, error in enumerate(errors)
+    ]
+    placed = errors.count(None)
+    return JsonResponse({
+        'placed': placed,
+        'rejected': len(errors) - placed,
+        'results': results,
+    })
+
+
+@login_required
+@read_from_replica
 def my_bets(request):
-    # Get all bets for the current user, ordered by most recent first
-    bets = Bet.objects.filter(user=request.user).select_related(
-        'event', 'option'
-    ).order_by('-created_at')
-    
-    # Group bets by event status
-    active_bets = []
-    past_bets = []
-    
-    for bet in bets:
-        if bet.event.deadline > timezone.now():
-            active_bets.append(bet)
-        else:
-            past_bets.append(bet)
-    
+    # Bets for the current user, split by event status in SQL and newest first
+    now = timezone.now()
+    bets = Bet.objects.filter(user=request.user)
+    listed_bets = bets.select_related('event', 'option').only(
+        'id', 'odds', 'created_at',
+        'event__id', 'event__title', 'event__image', 'event__image_ready', 'event__deadline',
+        'option__id', 'option__title',
+    )
+    active_bets = listed_bets.filter(event__deadline__gt=now)
+    past_bets = listed_bets.filter(event__deadline__lte=now)
+
+    totals = bets.aggregate(
+        active=Count('id', filter=Q(event__deadline__gt=now)),
+        past=Count('id', filter=Q(event__deadline__lte=now)),
+    )
+
     context = {
-        'active_bets': active_bets,
-        'past_bets': past_bets,
-        'total_active_bets': len(active_bets),
-        'total_past_bets': len(past_bets),
+        'active_bets': CursorPaginator(active_bets, 20).get_page(request.GET.get('active_cursor')),
+        'past_bets': CursorPaginator(past_bets, 20).get_page(request.GET.get('past_cursor')),
+        'total_active_bets': totals['active'],
+        'total_past_bets': totals['past'],
     }
-    
+
     return render(request, 'my_bets.html', context)
 
 
+@login_required
+def notifications(request):
+    """Inbox with the user's notifications, newest first"""
+    from .services import get_unread_notification_count
+
+    listed = EmailNotifications.objects.filter(user=request.user).only(
+        'id', 'kind', 'parameters', 'created_at', 'is_read',
+    )
+    page_obj = CursorPaginator(listed, 20).get_page(request.GET.get('cursor'))
+
+    # Events the notifications on this page refer to, in one query
+    event_ids = {(n.parameters or {}).get('event_id') for n in page_obj} - {None}
+    events = Event.objects.only('id', 'title').in_bulk(event_ids) if event_ids else {}
+    for notification in page_obj:
+        notification.event = events.get((notification.parameters or {}).get('event_id'))
+
+    context = {
+        'notifications': page_obj,
+        'unread_count': get_unread_notification_count(request.user),
+    }
+    return render(request, 'notifications.html', context)
+
+
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    """Mark every notification of the user as read with one UPDATE"""
+    from .services import mark_notifications_read
+
+    mark_notifications_read(request.user)
+    return redirect('notifications')
+
+
+@cache_anonymous_page('latest_events')
+@read_from_replica
 def latest_events(request):
     """View for displaying the latest events"""
     query = Q(is_public=True)
     if request.user.is_authenticated:
         query |= Q(creator=request.user)
 
-    events = Event.objects.filter(query).select_related('creator').order_by('-created_at')
+    events = Event.objects.filter(query).select_related('creator')
 
     # Paginate events
-    paginator = Paginator(events, 12)  # Show 12 events per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(events, 12)  # Show 12 events per page
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    _prefetch_image_derivatives(page_obj)
 
     context = {
         'events': page_obj,
@@ -300,32 +458,106 @@ def latest_events(request):
     return render(request, 'event_list.html', context)
 
 
+@cache_anonymous_page('latest_events')
+@read_from_replica
+async def alatest_events(request):
+    """Async ``latest_events``, served when ``ASYNC_VIEWS`` is on"""
+    user = await request.auser()
+    query = Q(is_public=True)
+    if user.is_authenticated:
+        query |= Q(creator=user)
+
+    events = Event.objects.filter(query).select_related('creator')
+
+    # Paginate events
+    paginator = CursorPaginator(events, 12)  # Show 12 events per page
+    page_obj = await paginator.aget_page(request.GET.get('cursor'))
+    await _aprefetch_image_derivatives(page_obj)
+
+    context = {
+        'events': page_obj,
+        'title': _('Latest Events'),
+        'show_bet_count': False,
+        'show_event_count': True,
+    }
+    return await _arender(request, 'event_list.html', context)
+
+
+@cache_anonymous_page('popular_events')
+@read_from_replica
 def popular_events(request):
     """View for displaying the most popular events"""
-    # Get events with the most bets in the last 7 days
-    recent_date = timezone.now() - timedelta(days=7)
+    from .services import get_popular_events
+
+    # Precomputed ranking of public events by bets in the last 7 days,
+    # plus the user's own private events
+    paginator = Paginator(get_popular_events(request.user), 12)  # Show 12 events per page
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+
+    ranking = page_obj.object_list
     query = Q(is_public=True)
     if request.user.is_authenticated:
         query |= Q(creator=request.user)
+    events = Event.objects.filter(query).select_related('creator').in_bulk(
+        [event_id for event_id, _count in ranking]
+    )
+    page_obj.object_list = []
+    for event_id, recent_bet_count in ranking:
+        if event_id in events:
+            events[event_id].recent_bet_count = recent_bet_count
+            page_obj.object_list.append(events[event_id])
+    _prefetch_image_derivatives(page_obj.object_list)
 
-    events = Event.objects.filter(
-        query,
-        bets__created_at__gte=recent_date
-    ).select_related('creator').annotate(
-        bet_count=Count('bets')
-    ).order_by('-bet_count')
+    context = {
+        'events': page_obj,
+        'title': _('Popular Events'),
+        'show_bet_count': True,
+    }
+    return render(request, 'event_list.html', context)
 
-    # Paginate events
-    paginator = Paginator(events, 12)  # Show 12 events per page
+
+@cache_anonymous_page('popular_events')
+@read_from_replica
+async def apopular_events(request):
+    """Async ``popular_events``, served when ``ASYNC_VIEWS`` is on"""
+    from .services import get_popular_events
+
+    # Precomputed ranking of public events by bets in the last 7 days,
+    # plus the user's own private events
+    user = await request.auser()
+    paginator = Paginator(await sync_to_async(get_popular_events)(user), 12)  # Show 12 events per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    ranking = page_obj.object_list
+    query = Q(is_public=True)
+    if user.is_authenticated:
+        query |= Q(creator=user)
+    events = await Event.objects.filter(query).select_related('creator').ain_bulk(
+        [event_id for event_id, _count in ranking]
+    )
+    page_obj.object_list = []
+    for event_id, recent_bet_count in ranking:
+        if event_id in events:
+            events[event_id].recent_bet_count = recent_bet_count
+            page_obj.object_list.append(events[event_id])
+    await _aprefetch_image_derivatives(page_obj.object_list)
+
     context = {
         'events': page_obj,
         'title': _('Popular Events'),
         'show_bet_count': True,
     }
-    return render(request, 'event_list.html', context)
+    return await _arender(request, 'event_list.html', context)
+
+
+@login_required
+def page_cache_status(request):
+    """Hit and miss counters of the anonymous page cache, for staff."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden(_("You don't have permission to see cache statistics."))
+    return JsonResponse(page_cache_stats())
 
 
 def register(request):
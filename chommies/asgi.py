@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chommies.settings')
+# Serve the event pages from their async views, see ASYNC_VIEWS
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+# Stream live odds to event pages, see LIVE_ODDS_BACKEND
+os.environ.setdefault('LIVE_ODDS_BACKEND', 'memory')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up: live odds streams are served next to Django
+from bets.live import LiveOddsApplication  # noqa: E402
+
+application = LiveOddsApplication(django_application)